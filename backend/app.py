@@ -12,8 +12,11 @@ from routes.profile import profile_bp
 from routes.changepassword import change_password_bp
 from routes.openai import openai_bp
 from routes.scraper import scraper_bp
+from routes.pipeline import pipeline_bp
 # Import shared instances from extensions
-from extensions import bcrypt, mongo, jwt
+from extensions import bcrypt, mongo, jwt, metrics
+from metrics import MongoCommandListener
+from indexes import ensure_indexes
 
 app = Flask(__name__)
 CORS(app)  # This will allow cross-origin requests
@@ -24,11 +27,29 @@ load_dotenv()
 app.config["MONGO_URI"] = os.getenv("MONGO_URI")
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
 app.config["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+app.config["ENSURE_INDEXES"] = os.getenv("ENSURE_INDEXES", "true").lower() == "true"
 
 # Initialize shared instances with the app
 bcrypt.init_app(app)
-mongo.init_app(app, tlsCAFile=certifi.where())
+if app.config["METRICS_ENABLED"]:
+    mongo.init_app(app, tlsCAFile=certifi.where(), event_listeners=[MongoCommandListener(metrics)])
+else:
+    mongo.init_app(app, tlsCAFile=certifi.where())
 jwt.init_app(app)
+metrics.init_app(app, enabled=app.config["METRICS_ENABLED"])
+
+# Create or verify the indexes the routes rely on
+app.config["USERNAME_INDEX_ENFORCED"] = False
+if app.config["ENSURE_INDEXES"]:
+    index_report = ensure_indexes(mongo.db)
+    if index_report["missing"]:
+        print(f"WARNING: missing MongoDB indexes: {', '.join(index_report['missing'])}")
+    elif index_report["created"]:
+        print(f"Created MongoDB indexes: {', '.join(index_report['created'])}")
+    app.config["USERNAME_INDEX_ENFORCED"] = "users.username_unique" not in index_report["missing"]
+if not app.config["USERNAME_INDEX_ENFORCED"]:
+    print("WARNING: users.username_unique is not confirmed; /register checks for existing usernames itself")
 
 # Register blueprints
 app.register_blueprint(register_bp)
@@ -38,6 +59,7 @@ app.register_blueprint(profile_bp)
 app.register_blueprint(change_password_bp)
 app.register_blueprint(openai_bp)
 app.register_blueprint(scraper_bp)
+app.register_blueprint(pipeline_bp)
 
 
 
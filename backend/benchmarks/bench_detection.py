@@ -0,0 +1,249 @@
+"""
+Benchmark for the /process-image detection path.
+
+Drives the endpoint through the Flask test client with generated fixtures at
+several resolutions and JPEG qualities, sweeps concurrency levels and reports
+latency percentiles, throughput, peak RSS and the time spent in decode,
+inference and post-processing.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_detection --stub              # no weights needed
+    python -m benchmarks.bench_detection --concurrency 1 4 8
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The benchmark loads its own model and must not be skewed by cached results
+os.environ.setdefault("MODEL_PRELOAD", "false")
+os.environ.setdefault("DETECTION_CACHE", "false")
+
+import cv2
+import numpy as np
+from flask import Flask
+
+from routes import process
+from routes.inference_pool import PoolBoxes, PoolResult
+
+RESOLUTIONS = [(640, 480), (1920, 1080), (4032, 3024)]
+QUALITIES = [60, 85, 95]
+
+
+class StubModel:
+    """
+    Stand-in for the detector that returns fixed boxes after a fixed delay,
+    so the non-model code can be benchmarked on any machine.
+    """
+
+    names = {0: "apple", 1: "banana", 2: "orange"}
+
+    def __init__(self, latency_ms: float = 5.0, boxes: int = 20):
+        self.latency = latency_ms / 1000.0
+        rng = np.random.default_rng(0)
+        corners = rng.uniform(0, 560, (boxes, 2))
+        self.xyxy = np.hstack([corners, corners + rng.uniform(20, 80, (boxes, 2))]).astype(np.float32)
+        self.conf = rng.uniform(0.1, 0.95, boxes).astype(np.float32)
+        self.cls = rng.integers(0, len(self.names), boxes).astype(np.float32)
+
+    def __call__(self, images):
+        time.sleep(self.latency)
+        return [PoolResult(PoolBoxes(self.xyxy, self.conf, self.cls), self.names) for _ in images]
+
+
+def make_fixtures():
+    """Encode a synthetic produce-like scene at every resolution and quality."""
+    fixtures = []
+    for width, height in RESOLUTIONS:
+        rng = np.random.default_rng(width)
+        img = np.zeros((height, width, 3), dtype=np.uint8)
+        img[:] = np.linspace(40, 200, width, dtype=np.uint8)[None, :, None]
+        for _ in range(30):
+            center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+            radius = int(rng.integers(min(width, height) // 40, min(width, height) // 8))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.circle(img, center, radius, color, -1)
+        noise = rng.integers(0, 20, img.shape, dtype=np.uint8)
+        img = cv2.add(img, noise)
+        for quality in QUALITIES:
+            ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok:
+                fixtures.append({"name": f"{width}x{height}_q{quality}", "data": encoded.tobytes()})
+    return fixtures
+
+
+class StageTimer:
+    """Wraps the pipeline stages in routes.process and accumulates their durations."""
+
+    STAGES = {
+        "decode": "_decode_image",
+        "inference": "_detect",
+        "postprocess": "select_detections",
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {stage: [] for stage in self.STAGES}
+        self._originals = {}
+
+    def install(self):
+        for stage, name in self.STAGES.items():
+            original = getattr(process, name)
+            self._originals[name] = original
+            setattr(process, name, self._wrap(stage, original))
+
+    def uninstall(self):
+        for name, original in self._originals.items():
+            setattr(process, name, original)
+
+    def reset(self):
+        with self._lock:
+            for samples in self.samples.values():
+                samples.clear()
+
+    def _wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.samples[stage].append(elapsed)
+        return timed
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    values = np.percentile(np.array(samples) * 1000.0, [50, 95, 99])
+    return {"p50": float(values[0]), "p95": float(values[1]), "p99": float(values[2])}
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS watermark (VmHWM) so the next reading covers one scenario."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS since the last reset_peak_rss(), or of the whole process where that isn't supported."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss is reported in kilobytes on Linux and never resets
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_scenario(app, fixture, concurrency: int, requests: int, timer: StageTimer):
+    timer.reset()
+    per_scenario_rss = reset_peak_rss()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        nonlocal errors
+        client = app.test_client()
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.post(
+                "/process-image",
+                data={"image": (io.BytesIO(fixture["data"]), "fixture.jpg")},
+                content_type="multipart/form-data",
+            )
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, per_worker))
+    wall = time.perf_counter() - started
+
+    return {
+        "fixture": fixture["name"],
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "images_per_second": requests / wall if wall else 0.0,
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {stage: percentiles(samples) for stage, samples in timer.samples.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_per_scenario": per_scenario_rss,
+    }
+
+
+def print_report(results):
+    header = f"{'fixture':<18}{'conc':>5}{'img/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'decode':>9}{'infer':>9}{'post':>9}{'rss MB':>9}{'err':>5}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        latency = result["latency_ms"]
+        stages = result["stages_ms"]
+        print(
+            f"{result['fixture']:<18}{result['concurrency']:>5}{result['images_per_second']:>9.1f}"
+            f"{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+            f"{stages['decode']['p50']:>9.1f}{stages['inference']['p50']:>9.1f}{stages['postprocess']['p50']:>9.1f}"
+            f"{result['peak_rss_mb']:>9.0f}{result['errors']:>5}"
+        )
+    print("\nLatencies in ms; stage columns are p50 per request.")
+    if results and not all(result["peak_rss_per_scenario"] for result in results):
+        print("Peak RSS could not be reset per scenario here; rss MB is the process-wide peak so far.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /process-image detection path")
+    parser.add_argument("--stub", action="store_true", help="Use a stub model instead of loading weights")
+    parser.add_argument("--stub-latency-ms", type=float, default=5.0, help="Simulated inference time of the stub model")
+    parser.add_argument("--weights", default=process.MODEL_WEIGHTS, help="Weights to load when not using --stub")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=40, help="Requests per fixture and concurrency level")
+    parser.add_argument("--json", help="Also write the raw results to this file")
+    args = parser.parse_args()
+
+    if args.stub:
+        process.registry.loader = lambda version: StubModel(args.stub_latency_ms)
+        process.registry.load("stub")
+    else:
+        process.registry.load(args.weights)
+
+    app = Flask(__name__)
+    app.register_blueprint(process.process_bp)
+
+    fixtures = make_fixtures()
+    timer = StageTimer()
+    timer.install()
+    results = []
+    try:
+        for fixture in fixtures:
+            for concurrency in args.concurrency:
+                results.append(run_scenario(app, fixture, concurrency, args.requests, timer))
+    finally:
+        timer.uninstall()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
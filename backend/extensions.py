@@ -2,8 +2,10 @@
 from flask_bcrypt import Bcrypt
 from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
+from metrics import Metrics
 
 # Create the shared instances
 bcrypt = Bcrypt()
 mongo = PyMongo()
 jwt = JWTManager()
+metrics = Metrics()
@@ -0,0 +1,59 @@
+# indexes.py
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+# Indexes the application relies on, by collection. users.username must be unique:
+# registration depends on it to reject duplicates.
+REQUIRED_INDEXES = {
+    "users": [
+        {"keys": [("username", ASCENDING)], "name": "username_unique", "unique": True},
+    ],
+    "contact_messages": [
+        {"keys": [("created_at", DESCENDING)], "name": "created_at_desc"},
+    ],
+}
+
+
+def _same_keys(existing: dict, spec: dict) -> bool:
+    return [tuple(key) for key in existing["key"]] == spec["keys"]
+
+
+def _matches(existing: dict, spec: dict) -> bool:
+    return _same_keys(existing, spec) and bool(existing.get("unique", False)) == bool(spec.get("unique", False))
+
+
+def ensure_indexes(db, required=REQUIRED_INDEXES) -> dict:
+    """
+    Create every required index that is missing and verify the ones that exist.
+
+    Safe to run on every start. Returns {"present", "created", "missing"}
+    lists of "collection.index" names; an index ends up in missing when it
+    could not be created, e.g. a unique index over existing duplicates, or
+    when an index on the same keys exists with different options.
+    """
+    report = {"present": [], "created": [], "missing": []}
+    for collection_name, specs in required.items():
+        collection = db[collection_name]
+        try:
+            existing = list(collection.index_information().values())
+        except PyMongoError as e:
+            print(f"Could not list indexes of {collection_name}: {str(e)}")
+            report["missing"].extend(f"{collection_name}.{spec['name']}" for spec in specs)
+            continue
+
+        for spec in specs:
+            label = f"{collection_name}.{spec['name']}"
+            if any(_matches(index, spec) for index in existing):
+                report["present"].append(label)
+                continue
+            if any(_same_keys(index, spec) for index in existing):
+                print(f"Index {label} exists with different options; drop it to let it be recreated")
+                report["missing"].append(label)
+                continue
+            try:
+                collection.create_index(spec["keys"], name=spec["name"], unique=spec.get("unique", False))
+                report["created"].append(label)
+            except PyMongoError as e:
+                print(f"Could not create index {label}: {str(e)}")
+                report["missing"].append(label)
+    return report
@@ -0,0 +1,215 @@
+# metrics.py
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from flask import Response, g, request
+from pymongo import monitoring
+
+# Latency buckets in seconds, from sub-millisecond Mongo queries to multi-second scrapes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = _format_labels(self.label_names, labels)
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = _format_labels(self.label_names + ("le",), labels + (le,))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{label_text} {series['sum']}")
+                lines.append(f"{self.name}_count{label_text} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Span:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(self.labels, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """
+    Request and span metrics exposed in the Prometheus text format.
+
+    init_app() times every request by blueprint and endpoint and serves them
+    on /metrics. span(name) times a named step anywhere in the code. With
+    enabled=False nothing is registered and spans are shared no-op contexts.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._noop = nullcontext()
+        self._gauges = {}
+        self.requests_total = Counter(
+            "fruitlens_http_requests_total", "HTTP requests by blueprint, endpoint and status",
+            ("blueprint", "endpoint", "method", "status"),
+        )
+        self.request_duration = Histogram(
+            "fruitlens_http_request_duration_seconds", "HTTP request latency by blueprint and endpoint",
+            ("blueprint", "endpoint", "method"),
+        )
+        self.span_duration = Histogram(
+            "fruitlens_span_duration_seconds", "Latency of named processing steps",
+            ("span",),
+        )
+
+    def init_app(self, app, enabled: bool = True):
+        self.enabled = enabled
+        if not enabled:
+            return
+
+        app.before_request(self._start_timer)
+        app.after_request(self._record_request)
+        app.add_url_rule('/metrics', 'metrics', self._serve_metrics, methods=['GET'])
+
+    def span(self, name: str):
+        """Context manager that records how long the enclosed block takes."""
+        if not self.enabled:
+            return self._noop
+        return _Span(self.span_duration, (name,))
+
+    def timed(self, name: str):
+        """Decorator form of span()."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe_span(self, name: str, seconds: float):
+        """Record a span whose duration was measured elsewhere."""
+        if self.enabled:
+            self.span_duration.observe((name,), seconds)
+
+    def register_gauge(self, name: str, help_text: str, callback):
+        """Expose callback()'s current value as a gauge; a dict return value becomes one series per key."""
+        self._gauges[name] = (help_text, callback)
+
+    def render(self) -> str:
+        lines = []
+        lines.extend(self.requests_total.render())
+        lines.extend(self.request_duration.render())
+        lines.extend(self.span_duration.render())
+        for name, (help_text, callback) in sorted(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"Error reading gauge {name}: {str(e)}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for key, item in sorted(value.items()):
+                    lines.append(f'{name}{{key="{key}"}} {item}')
+            elif value is not None:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _start_timer(self):
+        g._metrics_started = time.perf_counter()
+
+    def _record_request(self, response):
+        started = g.pop("_metrics_started", None)
+        if started is None or request.endpoint == "metrics":
+            return response
+        endpoint = request.endpoint or "unmatched"
+        blueprint = request.blueprint or "app"
+        labels = (blueprint, endpoint, request.method)
+        self.requests_total.inc((*labels, str(response.status_code)))
+        if response.is_streamed:
+            # The body is generated after this hook returns; time the request until the stream closes
+            response.call_on_close(lambda: self.request_duration.observe(labels, time.perf_counter() - started))
+        else:
+            self.request_duration.observe(labels, time.perf_counter() - started)
+        return response
+
+    def _serve_metrics(self):
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """PyMongo command listener that records every Mongo command as a span."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metrics.observe_span(f"mongo.{event.command_name}", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.metrics.observe_span(f"mongo.{event.command_name}", event.duration_micros / 1e6)
@@ -0,0 +1,252 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .price_cache import cache_key
+
+# Pipeline stage deriving a run report's hit rate: the share of the entries it warmed that served a request
+_HIT_RATE_STAGE = {"$set": {"hit_rate": {"$cond": [
+    {"$gt": ["$warmed", 0]},
+    {"$divide": [{"$ifNull": ["$served_entries", 0]}, "$warmed"]},
+    0.0,
+]}}}
+
+
+class CacheWarmer:
+    """
+    Pre-scrapes the most requested (location, product) pairs off-peak.
+
+    record() counts every lookup in memory, for at most max_pending distinct
+    pairs; start() flushes the counts to the demand collection every
+    check_interval seconds. With schedule=True, once a day, during the hours
+    in window (local time, start inclusive, end exclusive), the top budget
+    pairs requested within lookback_days are passed to warm_fn(location,
+    product, run_id) with up to concurrency at a time, skipping pairs scraped
+    less than min_age_seconds ago. A dry run only reports what would be
+    warmed. Each flush also adds the requests served by warmed entries, as
+    returned by served_fn(), to the report of the run that warmed them.
+    """
+
+    def __init__(self, demand_getter, runs_getter, warm_fn, age_fn, budget: int = 50, concurrency: int = 2,
+                 window=(2, 5), min_age_seconds: float = 3 * 3600, lookback_days: int = 7,
+                 dry_run: bool = False, check_interval: float = 60, max_pending: int = 10000, served_fn=None):
+        self._demand_getter = demand_getter
+        self._runs_getter = runs_getter
+        self.warm_fn = warm_fn
+        self.age_fn = age_fn
+        self.budget = budget
+        self.concurrency = max(1, concurrency)
+        self.window = window
+        self.min_age_seconds = min_age_seconds
+        self.lookback_days = lookback_days
+        self.dry_run = dry_run
+        self.check_interval = check_interval
+        self.max_pending = max_pending
+        self.served_fn = served_fn
+        self.scheduled = False
+        self.dropped = 0
+        self._pending = Counter()
+        self._locations = {}
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, location: str, product_name: str):
+        key = cache_key(location, product_name)
+        with self._lock:
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                # Until the next flush empties it, only pairs already counted are tracked
+                self.dropped += 1
+                return
+            self._pending[key] += 1
+            self._locations[key] = (location, product_name)
+
+    def flush(self):
+        """Add the counts recorded since the last flush to the demand and warming run collections."""
+        self._flush_demand()
+        self._flush_served()
+
+    def _flush_demand(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            locations, self._locations = self._locations, {}
+        if not pending:
+            return
+
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"_id": key},
+                {
+                    "$inc": {"count": count},
+                    "$set": {"last_requested": now},
+                    "$setOnInsert": {"location": locations[key][0], "product": locations[key][1]},
+                },
+                upsert=True,
+            )
+            for key, count in pending.items()
+        ]
+        try:
+            self._demand_getter().bulk_write(operations, ordered=False)
+        except Exception as e:
+            print(f"Error flushing scrape demand: {str(e)}")
+            # Keep the counts for the next flush
+            with self._lock:
+                self._pending.update(pending)
+                for key, pair in locations.items():
+                    self._locations.setdefault(key, pair)
+
+    def plan(self, budget: int = None) -> list:
+        """The most requested recent pairs, each marked 'warm' or 'skip' depending on cache age."""
+        budget = self.budget if budget is None else budget
+        since = datetime.utcnow() - timedelta(days=self.lookback_days)
+        popular = self._demand_getter().find(
+            {"last_requested": {"$gte": since}},
+            {"location": 1, "product": 1, "count": 1},
+        ).sort("count", DESCENDING).limit(budget)
+
+        entries = []
+        for doc in popular:
+            age = self.age_fn(doc["location"], doc["product"])
+            fresh = age is not None and age < self.min_age_seconds
+            entries.append({
+                "location": doc["location"],
+                "product": doc["product"],
+                "requests": doc["count"],
+                "cache_age": round(age, 1) if age is not None else None,
+                "action": "skip" if fresh else "warm",
+            })
+        return entries
+
+    def run(self, dry_run: bool = None, budget: int = None, run_id: str = None) -> dict:
+        """Warm the current plan and return a report of what was done."""
+        dry_run = self.dry_run if dry_run is None else dry_run
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("A cache warming run is already in progress")
+        try:
+            self.flush()
+            started = time.monotonic()
+            report = {
+                "_id": run_id or uuid.uuid4().hex,
+                "started_at": datetime.utcnow(),
+                "dry_run": dry_run,
+                "planned": 0,
+                "skipped": 0,
+                "warmed": 0,
+                "errors": 0,
+            }
+            entries = self.plan(budget)
+            targets = [entry for entry in entries if entry["action"] == "warm"]
+            report["planned"] = len(targets)
+            report["skipped"] = len(entries) - len(targets)
+            if not dry_run:
+                # Exists before any warmed entry can serve a request and be credited to it
+                self._save_report(report)
+
+            if not dry_run and targets:
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="cache-warm") as executor:
+                    outcomes = executor.map(lambda entry: self._warm_one(entry, report["_id"]), targets)
+                    for ok in outcomes:
+                        report["warmed" if ok else "errors"] += 1
+
+            report["duration"] = round(time.monotonic() - started, 3)
+            report["entries"] = entries
+            self._save_report(report)
+            return report
+        finally:
+            self._run_lock.release()
+
+    def _warm_one(self, entry, run_id) -> bool:
+        try:
+            result = self.warm_fn(entry["location"], entry["product"], run_id)
+            return result.get("status") == "success"
+        except Exception as e:
+            print(f"Error warming {entry['product']} in {entry['location']}: {str(e)}")
+            return False
+
+    def _save_report(self, report):
+        # Set field by field, keeping any hits recorded while the run was still going
+        fields = {name: {"$literal": value} for name, value in report.items() if name != "_id"}
+        try:
+            self._runs_getter().update_one({"_id": report["_id"]}, [{"$set": fields}, _HIT_RATE_STAGE], upsert=True)
+        except Exception as e:
+            print(f"Error saving cache warming report: {str(e)}")
+
+    def _flush_served(self):
+        if not self.served_fn:
+            return
+        try:
+            runs = self.served_fn()
+        except Exception as e:
+            print(f"Error flushing warmed cache hits: {str(e)}")
+            return
+        for run_id, served in runs.items():
+            try:
+                self._runs_getter().update_one({"_id": run_id}, [
+                    {"$set": {
+                        "served_requests": {"$add": [{"$ifNull": ["$served_requests", 0]}, served["requests"]]},
+                        "served_entries": {"$add": [{"$ifNull": ["$served_entries", 0]}, served["entries"]]},
+                    }},
+                    _HIT_RATE_STAGE,
+                ])
+            except Exception as e:
+                print(f"Error updating cache warming report {run_id}: {str(e)}")
+
+    def recent_runs(self, limit: int = 10) -> list:
+        return list(self._runs_getter().find({}, {"entries": 0}).sort("started_at", DESCENDING).limit(limit))
+
+    def start(self, schedule: bool = True):
+        """Start the background thread that flushes demand and, if schedule, runs the daily warm-up."""
+        self.scheduled = schedule
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._schedule, name="cache-warmer", daemon=True)
+            self._thread.start()
+
+    def _in_window(self, now: datetime) -> bool:
+        start, end = self.window
+        if start <= end:
+            return start <= now.hour < end
+        return now.hour >= start or now.hour < end
+
+    def _schedule(self):
+        while True:
+            time.sleep(self.check_interval)
+            self.flush()
+            now = datetime.now()
+            if not self.scheduled or not self._in_window(now):
+                continue
+            # One scheduled run per day across every process sharing the database
+            run_id = f"scheduled-{now.date().isoformat()}"
+            try:
+                self._runs_getter().insert_one({"_id": run_id, "started_at": datetime.utcnow(), "claimed": True})
+            except DuplicateKeyError:
+                continue
+            except Exception as e:
+                print(f"Error claiming cache warming run: {str(e)}")
+                continue
+            try:
+                report = self.run(run_id=run_id)
+                print(f"Cache warming: warmed {report['warmed']}, skipped {report['skipped']}, "
+                      f"errors {report['errors']}")
+            except Exception as e:
+                print(f"Error during cache warming: {str(e)}")
+
+    def status(self) -> dict:
+        with self._lock:
+            pending = sum(self._pending.values())
+        return {
+            "window": list(self.window),
+            "budget": self.budget,
+            "concurrency": self.concurrency,
+            "min_age_seconds": self.min_age_seconds,
+            "dry_run": self.dry_run,
+            "pending_requests": pending,
+            "dropped_requests": self.dropped,
+            "running": self._run_lock.locked(),
+        }
@@ -0,0 +1,157 @@
+import os
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from extensions import metrics
+from .chp_scraper import ITEMS_HEBREW, RESULTS_TOP_N, parse_store_rows, rank_results
+from .locations import AddressCache
+
+# Base URL of the site; point it at a local server to run against captured pages
+CHP_BASE_URL = os.getenv("CHP_BASE_URL", "https://chp.co.il").rstrip("/")
+CHP_HTTP_TIMEOUT = float(os.getenv("CHP_HTTP_TIMEOUT", "10"))
+CHP_HTTP_POOL_SIZE = int(os.getenv("CHP_HTTP_POOL_SIZE", "10"))
+
+# The endpoints the site's own search form calls
+ADDRESS_AUTOCOMPLETE_PATH = "/autocompletion/addresses"
+PRODUCT_AUTOCOMPLETE_PATH = "/autocompletion/product_extended"
+COMPARE_RESULTS_PATH = "/main_page/compare_results"
+
+# Address form fields resolved for each location, shared by every HTTP search
+address_cache = AddressCache()
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+
+def parse_results_table(html: str):
+    """
+    Parse every row of the results-table in a compare_results page.
+
+    Raises ValueError when the page has no results-table, which means the
+    endpoint or the site's markup is not what this client expects.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    table = soup.find("table", class_="results-table")
+    if table is None:
+        raise ValueError("No results table in compare_results response")
+
+    rows = []
+    for row in table.find_all("tr")[1:]:  # Skip header row
+        cells = row.find_all("td")
+        if len(cells) >= 6:
+            rows.append([cell.get_text(" ", strip=True) for cell in cells[:6]])
+    return parse_store_rows(rows)
+
+
+class CHPHttpScraper:
+    """
+    Browserless chp.co.il client.
+
+    Calls the same autocomplete and compare_results endpoints as the site's
+    search form over a pooled HTTP session and parses the results table
+    directly, returning the same structure as CHPScraper.search_product.
+    """
+
+    def __init__(self, base_url: str = CHP_BASE_URL, timeout: float = CHP_HTTP_TIMEOUT,
+                 pool_size: int = CHP_HTTP_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504)),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+            "X-Requested-With": "XMLHttpRequest",
+            "Referer": f"{self.base_url}/",
+        })
+
+    def _get(self, path: str, params: dict):
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def resolve_address(self, location: str) -> dict:
+        """Resolve free-text location to the address fields the compare form submits."""
+        cached = address_cache.get(location)
+        if cached:
+            return cached
+
+        suggestions = self._get(ADDRESS_AUTOCOMPLETE_PATH, {"term": location}).json()
+        if not suggestions:
+            raise ValueError(f"No address found for {location}")
+        first = suggestions[0]
+        address = {
+            "shopping_address": first.get("value") or first.get("label") or location,
+            "shopping_address_city_id": first.get("city_id", ""),
+            "shopping_address_street_id": first.get("street_id", ""),
+        }
+        address_cache.put(location, address)
+        return address
+
+    def resolve_product(self, hebrew_product_name: str) -> dict:
+        """Resolve a product name to the product fields the compare form submits."""
+        suggestions = self._get(PRODUCT_AUTOCOMPLETE_PATH, {"term": hebrew_product_name}).json()
+        first = suggestions[0] if suggestions else {}
+        return {
+            "product_name_or_barcode": first.get("value") or hebrew_product_name,
+            "product_barcode": first.get("id", ""),
+        }
+
+    def fetch_results(self, address: dict, product: dict):
+        params = {**address, **product, "from": 0, "num_results": 100}
+        return parse_results_table(self._get(COMPARE_RESULTS_PATH, params).text)
+
+    @metrics.timed("http_scraper_search_product")
+    def search_product(self, location: str, product_name: str, top_n: int = RESULTS_TOP_N,
+                       include_all: bool = False) -> dict:
+        """Search for a product; same arguments and result shape as CHPScraper.search_product."""
+        hebrew_product_name = ITEMS_HEBREW.get(product_name)
+        if not hebrew_product_name:
+            return {
+                "status": "error",
+                "message": f"No Hebrew translation found for {product_name}",
+                "product": product_name
+            }
+
+        try:
+            address = self.resolve_address(location)
+            product = self.resolve_product(hebrew_product_name)
+            results = rank_results(self.fetch_results(address, product), top_n, include_all)
+        except Exception as e:
+            print(f"HTTP search for {product_name} failed: {str(e)}")
+            return {
+                "status": "error",
+                "message": str(e),
+                "product": product_name,
+                "error_type": "http"
+            }
+
+        return {
+            "status": "success",
+            "message": "Search completed",
+            "location": location,
+            "product": product_name,
+            "hebrew_product": hebrew_product_name,
+            "results": results,
+            "backend": "http"
+        }
+
+    def is_healthy(self) -> bool:
+        return True
+
+    def reset(self):
+        pass
+
+    def cleanup(self):
+        self.session.close()
@@ -2,12 +2,17 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.keys import Keys
 import platform
 import time
 import re
+import os
+import heapq
+from urllib.parse import urlparse
+from extensions import metrics
+from .locations import AddressCache, normalise_location
 
 # Dictionary mapping English names to Hebrew
 ITEMS_HEBREW = {
@@ -46,6 +51,118 @@ ITEMS_HEBREW = {
     "Olive": "זית"
 }
 
+# Per-step readiness timeouts in seconds
+CHP_PAGE_LOAD_TIMEOUT = float(os.getenv("CHP_PAGE_LOAD_TIMEOUT", "15"))
+CHP_AUTOCOMPLETE_TIMEOUT = float(os.getenv("CHP_AUTOCOMPLETE_TIMEOUT", "3"))
+CHP_RESULTS_TIMEOUT = float(os.getenv("CHP_RESULTS_TIMEOUT", "10"))
+CHP_NETWORK_IDLE_TIMEOUT = float(os.getenv("CHP_NETWORK_IDLE_TIMEOUT", "5"))
+
+# Suggestion list shown by the site's jQuery UI autocomplete fields
+AUTOCOMPLETE_SELECTOR = "ul.ui-autocomplete"
+
+# True once the document has loaded and no jQuery AJAX request is in flight
+NETWORK_IDLE_SCRIPT = (
+    "return document.readyState === 'complete' && "
+    "(typeof window.jQuery === 'undefined' || window.jQuery.active === 0);"
+)
+
+# Number of cheapest and nearest stores returned per product unless a request asks otherwise
+RESULTS_TOP_N = int(os.getenv("RESULTS_TOP_N", "3"))
+
+# Text of the first six cells of every results-table row, read in a single round-trip
+RESULTS_ROWS_SCRIPT = """
+var table = document.querySelector('.results-table');
+if (!table) return null;
+var rows = [];
+var trs = table.querySelectorAll('tr');
+for (var i = 1; i < trs.length; i++) {
+    var cells = trs[i].querySelectorAll('td');
+    if (cells.length < 6) continue;
+    var texts = [];
+    for (var j = 0; j < 6; j++) texts.push(cells[j].innerText);
+    rows.push(texts);
+}
+return rows;
+"""
+
+# Text of the current results table, used to tell when a new search has replaced it
+RESULTS_SIGNATURE_SCRIPT = (
+    "var table = document.querySelector('.results-table');"
+    "return table ? table.innerText : null;"
+)
+
+
+def parse_store_row(cells) -> dict:
+    """
+    Build a store entry from the text of a results-table row.
+
+    cells holds at least the first six cell texts: chain, branch, address,
+    distance, (unused) and price.
+    """
+    store_chain = cells[0]
+    store_name = cells[1]
+    address = cells[2]
+    distance = cells[3]
+    price_text = cells[5].strip()
+
+    # Convert price to float for sorting
+    try:
+        price = float(price_text.replace('₪', '').strip())
+    except ValueError:
+        price = float('inf')  # Handle invalid prices
+
+    # Convert distance to float (remove 'ק"מ' and convert)
+    try:
+        distance_num = float(distance.replace('ק"מ', '').strip())
+    except ValueError:
+        distance_num = float('inf')  # Handle invalid distances
+
+    return {
+        "store_chain": store_chain,
+        "store_name": store_name,
+        "address": address,
+        "distance": distance,
+        "distance_num": distance_num,
+        "price": price,
+        "price_display": f"₪{price:.2f}"
+    }
+
+
+def parse_store_rows(rows):
+    """Parse a list of row cell texts, skipping rows that fail to parse."""
+    results = []
+    for idx, cells in enumerate(rows, 1):
+        try:
+            results.append(parse_store_row(cells))
+        except Exception as e:
+            print(f"Error processing row {idx}: {str(e)}")
+    return results
+
+
+def rank_results(results, top_n: int = RESULTS_TOP_N, include_all: bool = False) -> dict:
+    """
+    Pick the top_n cheapest and the top_n nearest stores.
+
+    Uses partial selection rather than sorting the whole table. With
+    include_all the full parsed table is returned as well under 'all'.
+    """
+    ranked = {
+        "by_price": heapq.nsmallest(top_n, results, key=lambda x: x['price']),
+        "by_distance": heapq.nsmallest(top_n, results, key=lambda x: x['distance_num'])
+    }
+    if include_all:
+        ranked["all"] = results
+    return ranked
+
+
+# Address text the site's autocomplete resolved each location to, shared by all browser sessions
+address_cache = AddressCache()
+
+
+def _network_idle(driver):
+    return driver.execute_script(NETWORK_IDLE_SCRIPT)
+
+
 class CHPScraper:
     def __init__(self):
         # Set up Chrome options
@@ -68,26 +185,81 @@ class CHPScraper:
             
         try:
             print("Initializing Chrome browser...")
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.wait = WebDriverWait(self.driver, 10)
-            print("Chrome browser initialized successfully")
-            self._init_browser()
+            with metrics.span("chrome_startup"):
+                self.driver = webdriver.Chrome(options=chrome_options)
+                self.wait = WebDriverWait(self.driver, 10)
+                self.waits = {}
+                print("Chrome browser initialized successfully")
+                self._init_browser()
         except Exception as e:
             print(f"Error initializing Chrome: {str(e)}")
             raise
 
     def _init_browser(self):
         """Initialize the browser session"""
+        # A fresh page has no address entered yet
+        self.current_location = None
+        self.current_address = None
         try:
             print("Navigating to chp.co.il...")
             self.driver.get("https://chp.co.il")
-            time.sleep(2)  # Wait for initial page load
+            self._wait_for(
+                "page_load",
+                EC.presence_of_element_located((By.ID, "shopping_address")),
+                CHP_PAGE_LOAD_TIMEOUT,
+            )
             print("Navigation complete")
         except Exception as e:
             print(f"Error initializing browser: {str(e)}")
             self.cleanup()
             raise
 
+    def _wait_for(self, step: str, condition, timeout: float, required: bool = True):
+        """
+        Wait until condition holds, recording how long the step took.
+
+        Returns the condition's result, or None if an optional step timed out.
+        """
+        started = time.monotonic()
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(condition)
+        except TimeoutException:
+            if required:
+                raise
+            print(f"Timed out after {timeout}s waiting for {step}, continuing")
+            return None
+        finally:
+            elapsed = time.monotonic() - started
+            self.waits[step] = round(self.waits.get(step, 0.0) + elapsed, 3)
+            metrics.observe_span(f"chp_wait.{step}", elapsed)
+
+    def _results_changed(self, previous_table, previous_signature):
+        """Condition: the results table was replaced or its contents changed."""
+        def condition(driver):
+            if previous_table is not None:
+                try:
+                    previous_table.is_enabled()
+                except StaleElementReferenceException:
+                    return driver.execute_script(RESULTS_SIGNATURE_SCRIPT) is not None
+            signature = driver.execute_script(RESULTS_SIGNATURE_SCRIPT)
+            return signature is not None and signature != previous_signature
+        return condition
+
+    def is_healthy(self) -> bool:
+        """Check that the browser is still responding"""
+        try:
+            self.driver.execute_script("return document.readyState")
+            return True
+        except Exception as e:
+            print(f"Browser health check failed: {str(e)}")
+            return False
+
+    def reset(self):
+        """Return to chp.co.il if the session was used to browse elsewhere"""
+        hostname = urlparse(self.driver.current_url).hostname or ""
+        if hostname != "chp.co.il" and not hostname.endswith(".chp.co.il"):
+            self._init_browser()
+
     def cleanup(self):
         """Clean up browser resources"""
         try:
@@ -96,73 +268,26 @@ class CHPScraper:
         except Exception as e:
             print(f"Error during cleanup: {str(e)}")
 
-    def _extract_price_data(self):
+    def _extract_price_data(self, top_n: int = RESULTS_TOP_N, include_all: bool = False):
         """Extract price data from the search results table."""
         try:
-            # Wait for results table to load
-            time.sleep(2)
-            
             print("\n=== Starting Data Extraction ===")
             
             # Find the results table
-            table = self.wait.until(
+            self.wait.until(
                 EC.presence_of_element_located((By.CLASS_NAME, "results-table"))
             )
             print("Found results table")
             
-            # Find all rows (skip header)
-            rows = table.find_elements(By.TAG_NAME, "tr")[1:]  # Skip header row
-            print(f"Found {len(rows)} result rows")
-            
-            results = []
-            for idx, row in enumerate(rows, 1):
-                try:
-                    # Extract cells
-                    cells = row.find_elements(By.TAG_NAME, "td")
-                    if len(cells) >= 6:  # Ensure we have all needed cells
-                        store_chain = cells[0].text
-                        store_name = cells[1].text
-                        address = cells[2].text
-                        distance = cells[3].text
-                        price_text = cells[5].text.strip()
-                        
-                        # Convert price to float for sorting
-                        try:
-                            price = float(price_text.replace('₪', '').strip())
-                        except ValueError:
-                            price = float('inf')  # Handle invalid prices
-                            
-                        # Convert distance to float (remove 'ק"מ' and convert)
-                        try:
-                            distance_num = float(distance.replace('ק"מ', '').strip())
-                        except ValueError:
-                            distance_num = float('inf')  # Handle invalid distances
-                        
-                        store_data = {
-                            "store_chain": store_chain,
-                            "store_name": store_name,
-                            "address": address,
-                            "distance": distance,
-                            "distance_num": distance_num,
-                            "price": price,
-                            "price_display": f"₪{price:.2f}"
-                        }
-                        
-                        print(f"\nStore #{idx}:")
-                        print(f"  Chain: {store_chain}")
-                        print(f"  Branch: {store_name}")
-                        print(f"  Address: {address}")
-                        print(f"  Distance: {distance}")
-                        print(f"  Price: {store_data['price_display']}")
-                        
-                        results.append(store_data)
-                except Exception as e:
-                    print(f"Error processing row {idx}: {str(e)}")
-                    continue
+            # Read every row in one script call instead of a round-trip per cell
+            rows = self.driver.execute_script(RESULTS_ROWS_SCRIPT) or []
+            results = parse_store_rows(rows)
+            print(f"Parsed {len(results)} of {len(rows)} result rows")
             
-            # Sort results
-            results_by_price = sorted(results, key=lambda x: x['price'])[:3]
-            results_by_distance = sorted(results, key=lambda x: x['distance_num'])[:3]
+            # Select the best stores
+            ranked = rank_results(results, top_n, include_all)
+            results_by_price = ranked["by_price"]
+            results_by_distance = ranked["by_distance"]
             
             print("\n=== Best Prices ===")
             for idx, store in enumerate(results_by_price, 1):
@@ -178,10 +303,7 @@ class CHPScraper:
                 print(f"  Distance: {store['distance']}")
                 print(f"  Price: {store['price_display']}")
             
-            return {
-                "by_price": results_by_price,
-                "by_distance": results_by_distance
-            }
+            return ranked
             
         except Exception as e:
             print(f"Error extracting price data: {str(e)}")
@@ -195,13 +317,58 @@ class CHPScraper:
                 "by_distance": []
             }
 
-    def search_product(self, location: str, product_name: str) -> dict:
+    def enter_location(self, location: str):
+        """
+        Enter location in the address field unless this session already has it.
+
+        Raises if the address field cannot be used.
+        """
+        try:
+            # Wait for the address input field and enter location
+            address_input = self.wait.until(
+                EC.presence_of_element_located((By.ID, "shopping_address"))
+            )
+            location_key = normalise_location(location)
+            if (location_key == self.current_location
+                    and address_input.get_attribute("value") == self.current_address):
+                # This session already has the address entered from a previous item
+                print(f"Location unchanged, keeping: {self.current_address}")
+            else:
+                # Typing the previously resolved address makes autocomplete match it directly
+                address_text = address_cache.get(location) or location
+                address_input.clear()
+                print(f"Entering location: {address_text}")
+                address_input.send_keys(address_text)
+                print("Waiting for autocomplete...")
+                self._wait_for(
+                    "address_autocomplete",
+                    EC.visibility_of_element_located((By.CSS_SELECTOR, AUTOCOMPLETE_SELECTOR)),
+                    CHP_AUTOCOMPLETE_TIMEOUT,
+                    required=False,
+                )
+                print("Submitting location search...")
+                address_input.send_keys(Keys.RETURN)
+                self._wait_for("address_network_idle", _network_idle, CHP_NETWORK_IDLE_TIMEOUT, required=False)
+
+                self.current_location = location_key
+                self.current_address = address_input.get_attribute("value")
+                if self.current_address:
+                    address_cache.put(location, self.current_address)
+        except Exception:
+            self.current_location = None
+            raise
+
+    @metrics.timed("scraper_search_product")
+    def search_product(self, location: str, product_name: str, top_n: int = RESULTS_TOP_N,
+                       include_all: bool = False) -> dict:
         """
         Search for a product on chp.co.il
         
         Args:
             location (str): The location/address to search in
             product_name (str): The product name in English
+            top_n (int): Number of cheapest and nearest stores to return
+            include_all (bool): Also return every parsed row under results['all']
             
         Returns:
             dict: Search results including prices and stores
@@ -222,22 +389,12 @@ class CHPScraper:
                 }
                 
             print(f"Hebrew translation: {hebrew_product_name}")
+            self.waits = {}
             
             # Handle location input
             try:
                 print("\n--- Location Input ---")
-                # Wait for the address input field and enter location
-                address_input = self.wait.until(
-                    EC.presence_of_element_located((By.ID, "shopping_address"))
-                )
-                address_input.clear()
-                print(f"Entering location: {location}")
-                address_input.send_keys(location)
-                print("Waiting for autocomplete...")
-                time.sleep(2)
-                print("Submitting location search...")
-                address_input.send_keys(Keys.RETURN)
-                time.sleep(2)
+                self.enter_location(location)
             except Exception as e:
                 print(f"ERROR with location input: {str(e)}")
                 return {
@@ -257,10 +414,36 @@ class CHPScraper:
                 print(f"Entering product name: {hebrew_product_name}")
                 product_input.send_keys(hebrew_product_name)
                 print("Waiting for suggestions...")
-                time.sleep(2)
+                self._wait_for(
+                    "product_autocomplete",
+                    EC.visibility_of_element_located((By.CSS_SELECTOR, AUTOCOMPLETE_SELECTOR)),
+                    CHP_AUTOCOMPLETE_TIMEOUT,
+                    required=False,
+                )
+
+                # Remember the current results so we can tell when the new ones arrive
+                previous_tables = self.driver.find_elements(By.CLASS_NAME, "results-table")
+                previous_table = previous_tables[0] if previous_tables else None
+                previous_signature = self.driver.execute_script(RESULTS_SIGNATURE_SCRIPT)
+
                 print("Submitting product search...")
                 product_input.send_keys(Keys.RETURN)
-                time.sleep(3)
+                # Without a new table, the one on the page still belongs to the previous search
+                results_ready = self._wait_for(
+                    "results",
+                    self._results_changed(previous_table, previous_signature),
+                    CHP_RESULTS_TIMEOUT,
+                    required=False,
+                )
+                if not results_ready:
+                    print(f"ERROR: no new results for {product_name} within {CHP_RESULTS_TIMEOUT}s")
+                    return {
+                        "status": "error",
+                        "message": f"No results appeared within {CHP_RESULTS_TIMEOUT}s",
+                        "product": product_name,
+                        "error_type": "results_timeout"
+                    }
+                self._wait_for("results_network_idle", _network_idle, CHP_NETWORK_IDLE_TIMEOUT, required=False)
             except Exception as e:
                 print(f"ERROR with product input: {str(e)}")
                 return {
@@ -271,7 +454,7 @@ class CHPScraper:
             
             # Extract price data
             print("\n--- Data Extraction ---")
-            results = self._extract_price_data()
+            results = self._extract_price_data(top_n, include_all)
             
             response_data = {
                 "status": "success",
@@ -279,7 +462,8 @@ class CHPScraper:
                 "location": location,
                 "product": product_name,
                 "hebrew_product": hebrew_product_name,
-                "results": results
+                "results": results,
+                "waits": dict(self.waits)
             }
             
             print("\n=== Final Response Data ===")
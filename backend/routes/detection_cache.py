@@ -0,0 +1,166 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def content_key(data: bytes) -> str:
+    """Exact content hash of an uploaded file."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(data: bytes):
+    """
+    64-bit difference hash of an uploaded file, or None if it can't be decoded.
+
+    Decodes at 1/8 scale in grayscale, which is all a 9x8 dHash needs, so
+    near-duplicate lookups stay far cheaper than a full decode.
+    """
+    if not data:
+        return None
+    try:
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    except cv2.error:
+        return None
+    if img is None:
+        return None
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _band_layout(count: int) -> list:
+    """(shift, mask) of count contiguous bit bands covering a 64-bit hash, widths differing by at most one."""
+    count = max(1, min(count, 64))
+    bands = []
+    shift = 0
+    for number in range(count):
+        width = 64 // count + (1 if number < 64 % count else 0)
+        bands.append((shift, (1 << width) - 1))
+        shift += width
+    return bands
+
+
+class DetectionCache:
+    """
+    LRU cache of detection responses keyed by upload content.
+
+    Entries expire after ttl_seconds and the least recently used ones are
+    evicted once the estimated size of all entries exceeds max_bytes. When
+    phash_distance is set, entries can also be found by perceptual hash within
+    that Hamming distance. The hashes are indexed by phash_distance + 1 bit
+    bands: two hashes that differ in at most that many bits agree exactly on at
+    least one band, so only entries sharing a band are compared.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, phash_distance: int = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.phash_distance = phash_distance
+        self._entries = OrderedDict()
+        self._size = 0
+        # (variant, band number, band bits) -> keys of the entries with those bits
+        self._phash_index = {}
+        self._bands = _band_layout(phash_distance + 1) if phash_distance is not None else []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self._expired(entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["value"]
+            if entry:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def get_similar(self, phash: int, variant: str = None):
+        """
+        Return the closest live entry within phash_distance, or None.
+
+        Only entries stored with the same variant (e.g. the same detection
+        options) are considered.
+        """
+        if self.phash_distance is None or phash is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for band in self._band_keys(phash, variant):
+                candidates.update(self._phash_index.get(band, ()))
+            best_key = None
+            best_distance = self.phash_distance + 1
+            for key in candidates:
+                entry = self._entries[key]
+                if self._expired(entry):
+                    continue
+                distance = bin(entry["phash"] ^ phash).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            # A near-duplicate hit replaces the exact miss counted by get()
+            self.hits += 1
+            self.misses -= 1
+            return self._entries[best_key]["value"]
+
+    def put(self, key: str, value, phash: int = None, variant: str = None):
+        size = len(key) + len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "value": value,
+                "phash": phash,
+                "variant": variant,
+                "size": size,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._size += size
+            if phash is not None:
+                for band in self._band_keys(phash, variant):
+                    self._phash_index.setdefault(band, set()).add(key)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._phash_index.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _expired(self, entry) -> bool:
+        return entry["expires_at"] < time.monotonic()
+
+    def _band_keys(self, phash: int, variant):
+        return [(variant, number, (phash >> shift) & mask) for number, (shift, mask) in enumerate(self._bands)]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= entry["size"]
+        if entry["phash"] is not None:
+            for band in self._band_keys(entry["phash"], entry["variant"]):
+                keys = self._phash_index.get(band)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._phash_index[band]
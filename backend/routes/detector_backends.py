@@ -0,0 +1,157 @@
+import argparse
+import os
+
+# Supported DETECTOR_BACKEND values and the ultralytics export settings behind them
+BACKENDS = {
+    "pytorch": None,
+    "onnx": {"format": "onnx", "int8": False},
+    "onnx-int8": {"format": "onnx", "int8": True},
+    "openvino": {"format": "openvino", "int8": False},
+    "openvino-int8": {"format": "openvino", "int8": True},
+}
+
+
+def exported_path(weights: str, backend: str) -> str:
+    """Path of the exported model for a backend, following ultralytics' naming."""
+    stem = os.path.splitext(weights)[0]
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    if backend == "onnx-int8":
+        return f"{stem}_int8.onnx"
+    if backend == "openvino":
+        return f"{stem}_openvino_model"
+    if backend == "openvino-int8":
+        return f"{stem}_int8_openvino_model"
+    return weights
+
+
+def resolve_weights(weights: str, backend: str = "pytorch", imgsz: int = 640) -> str:
+    """
+    Return the model path to load for a backend, exporting it from the
+    PyTorch weights on first use.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}")
+    if backend == "pytorch":
+        return weights
+
+    path = exported_path(weights, backend)
+    if os.path.exists(path):
+        return path
+
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights} for the {backend} backend...")
+    settings = BACKENDS[backend]
+    if settings["format"] == "onnx":
+        exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True)
+        if settings["int8"]:
+            # ultralytics only quantises OpenVINO exports, so ONNX goes through onnxruntime
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(exported, path, weight_type=QuantType.QUInt8)
+            exported = path
+    else:
+        exported = YOLO(weights).export(format="openvino", imgsz=imgsz, int8=settings["int8"], dynamic=True)
+
+    if os.path.abspath(exported) != os.path.abspath(path):
+        os.replace(exported, path)
+    print(f"Exported model saved to {path}")
+    return path
+
+
+def load_detector(weights: str, backend: str = "pytorch", imgsz: int = 640):
+    """Load the detector for a backend, exporting it first if needed."""
+    # Imported here so the routes and the parity helpers load without torch
+    from ultralytics import YOLO
+
+    return YOLO(resolve_weights(weights, backend, imgsz), task="detect")
+
+
+def _box_iou(a, b) -> float:
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def _detections(result):
+    return [
+        (result.names[int(cls)], box, float(conf))
+        for cls, box, conf in zip(result.boxes.cls.tolist(), result.boxes.xyxy.tolist(), result.boxes.conf.tolist())
+    ]
+
+
+def _unmatched(detections, others, min_iou: float, max_conf_delta: float):
+    """Detections with no counterpart in others; each of others can match only once."""
+    available = list(others)
+    unmatched = []
+    for label, box, conf in detections:
+        match = next((
+            index for index, (other_label, other_box, other_conf) in enumerate(available)
+            if other_label == label
+            and _box_iou(box, other_box) >= min_iou
+            and abs(other_conf - conf) <= max_conf_delta
+        ), None)
+        if match is None:
+            unmatched.append({"label": label, "box": box, "confidence": conf})
+        else:
+            del available[match]
+    return unmatched
+
+
+def check_parity(weights: str, backend: str, images, imgsz: int = 640, min_iou: float = 0.9, max_conf_delta: float = 0.05):
+    """
+    Compare a backend's detections against the PyTorch reference.
+
+    Detections are matched one-to-one in both directions: same label, IoU of
+    at least min_iou and a confidence within max_conf_delta. Reference
+    detections the backend misses and extra backend detections both fail the
+    check. Returns a report dict with per-image results.
+    """
+    reference = load_detector(weights, "pytorch", imgsz)
+    candidate = load_detector(weights, backend, imgsz)
+
+    report = {"backend": backend, "images": [], "passed": True}
+    for image in images:
+        expected = _detections(reference(image, imgsz=imgsz, verbose=False)[0])
+        actual = _detections(candidate(image, imgsz=imgsz, verbose=False)[0])
+
+        missing = _unmatched(expected, actual, min_iou, max_conf_delta)
+        extra = _unmatched(actual, expected, min_iou, max_conf_delta)
+        report["images"].append({
+            "image": str(image),
+            "reference_detections": len(expected),
+            "backend_detections": len(actual),
+            "mismatches": missing + extra,
+            "missing": missing,
+            "extra": extra,
+        })
+        if missing or extra or len(expected) != len(actual):
+            report["passed"] = False
+
+    return report
+
+
+def main(argv=None) -> int:
+    """Command-line parity check; returns 0 if the backend passed, 1 otherwise."""
+    parser = argparse.ArgumentParser(description="Check a detector backend against the PyTorch reference")
+    parser.add_argument("images", nargs="+", help="Fixture images to compare on")
+    parser.add_argument("--weights", default=os.getenv("MODEL_WEIGHTS", "yolo11s.pt"))
+    parser.add_argument("--backend", default=os.getenv("DETECTOR_BACKEND", "onnx"), choices=sorted(BACKENDS))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--min-iou", type=float, default=0.9)
+    parser.add_argument("--max-conf-delta", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    result = check_parity(args.weights, args.backend, args.images, args.imgsz, args.min_iou, args.max_conf_delta)
+    for entry in result["images"]:
+        status = "OK" if not entry["mismatches"] else f"{len(entry['missing'])} missing, {len(entry['extra'])} extra"
+        print(f"{entry['image']}: {entry['reference_detections']} reference / {entry['backend_detections']} {args.backend} - {status}")
+    print("Parity check passed" if result["passed"] else "Parity check FAILED")
+    return 0 if result["passed"] else 1
+
+
+if __name__ == "__main__":
+    # Example: python -m routes.detector_backends --backend openvino-int8 fixtures/*.jpg
+    raise SystemExit(main())
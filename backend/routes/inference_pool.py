@@ -0,0 +1,252 @@
+import itertools
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+from .inference_worker import AUTHKEY_ENV
+
+# Directory the worker entry point is run from, so `routes` resolves as a package
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PoolBoxes:
+    """
+    Detection boxes returned from a pool worker.
+
+    Mirrors the parts of ultralytics' Boxes used by the routes: xyxy, conf and
+    cls arrays, and iteration that yields one single-row PoolBoxes per box.
+    """
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield PoolBoxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+
+class WorkerDied(RuntimeError):
+    """Raised for a task whose worker process exited while running it."""
+
+
+class PoolResult:
+    """A detection result for one frame, shaped like ultralytics' Results."""
+
+    def __init__(self, boxes, names):
+        self.boxes = boxes
+        self.names = names
+
+
+class InferencePool:
+    """
+    Runs the detector in dedicated worker processes.
+
+    Decoded frames are copied once into shared memory and only the segment
+    names travel through the task queue; each worker attaches to them, runs the
+    model and sends back plain box arrays. Workers are started with
+    `python -m routes.inference_worker` rather than a multiprocessing spawn, so
+    they never re-import the app's main module, and reach the task and result
+    queues through a manager server running on a thread of this process. A
+    worker that dies fails the task it was running with WorkerDied and is
+    replaced; predict() gives up after task_timeout seconds.
+    """
+
+    def __init__(self, weights: str, num_workers: int, threads: int = 0, task_timeout: float = None):
+        self._weights = weights
+        self._threads = threads
+        self.task_timeout = task_timeout
+        self._closing = False
+        self._task_queue = queue.Queue()
+        self._result_queue = queue.Queue()
+        self._authkey = os.urandom(32)
+        self._queue_server = self._serve_queues()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._ready = threading.Event()
+        self._started_at = time.monotonic()
+        self.names = {}
+        self.worker_stats = {
+            worker_id: {"tasks": 0, "frames": 0, "busy_seconds": 0.0, "restarts": 0}
+            for worker_id in range(num_workers)
+        }
+        # Task each worker is running, and whether it has loaded the model
+        self._running = {}
+        self._worker_ready = set()
+
+        self._workers = [self._spawn(worker_id) for worker_id in range(num_workers)]
+
+        self._collector = threading.Thread(target=self._collect_results, name="inference-collector", daemon=True)
+        self._collector.start()
+
+    def _serve_queues(self):
+        """Serve the task and result queues to the workers from a thread of this process."""
+        queues = type("PoolQueues", (BaseManager,), {})
+        queues.register("tasks", callable=lambda: self._task_queue)
+        queues.register("results", callable=lambda: self._result_queue)
+        server = queues(address=("127.0.0.1", 0), authkey=self._authkey).get_server()
+        threading.Thread(target=server.serve_forever, name="inference-queues", daemon=True).start()
+        return server
+
+    def _spawn(self, worker_id: int):
+        host, port = self._queue_server.address
+        return subprocess.Popen(
+            [sys.executable, "-m", "routes.inference_worker",
+             str(worker_id), self._weights, str(self._threads or 0), host, str(port)],
+            cwd=BACKEND_DIR,
+            env={**os.environ, AUTHKEY_ENV: self._authkey.hex()},
+        )
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Block until at least one worker has loaded the model."""
+        return self._ready.wait(timeout)
+
+    def predict(self, images, timeout: float = None):
+        """
+        Run a list of images through one worker and return a PoolResult per image.
+
+        Raises concurrent.futures.TimeoutError after timeout (default task_timeout)
+        and WorkerDied if the worker exits while running the task.
+        """
+        timeout = self.task_timeout if timeout is None else timeout
+        self._ready.wait(timeout)
+
+        segments = []
+        frames = []
+        for img in images:
+            segment = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+            np.ndarray(img.shape, dtype=img.dtype, buffer=segment.buf)[...] = img
+            segments.append(segment)
+            frames.append((segment.name, img.shape, img.dtype.str))
+
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._pending[task_id] = (future, segments)
+        self._task_queue.put((task_id, frames))
+
+        try:
+            payload = future.result(timeout=timeout)
+        finally:
+            with self._lock:
+                self._pending.pop(task_id, None)
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+        return [PoolResult(PoolBoxes(xyxy, conf, cls), self.names) for xyxy, conf, cls in payload]
+
+    def _collect_results(self):
+        while True:
+            try:
+                message = self._result_queue.get(timeout=0.5)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if message is None:
+                break
+            if message[0] == "ready":
+                _, worker_id, names = message
+                self.names = names
+                with self._lock:
+                    self._worker_ready.add(worker_id)
+                self._ready.set()
+                print(f"Inference worker {worker_id} ready")
+                continue
+            if message[0] == "start":
+                _, worker_id, task_id = message
+                with self._lock:
+                    self._running[worker_id] = task_id
+                continue
+
+            _, worker_id, task_id, busy_seconds, payload, error = message
+            with self._lock:
+                stats = self.worker_stats[worker_id]
+                stats["tasks"] += 1
+                stats["busy_seconds"] += busy_seconds
+                stats["frames"] += len(payload) if payload else 0
+                self._running.pop(worker_id, None)
+                pending = self._pending.get(task_id)
+
+            if pending is None:
+                continue
+            future, _ = pending
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(payload)
+            self._check_workers()
+
+    def _check_workers(self):
+        """Fail the task of any worker that has died and start a replacement."""
+        if self._closing:
+            return
+        for worker_id, process in enumerate(self._workers):
+            if process.poll() is None:
+                continue
+            with self._lock:
+                task_id = self._running.pop(worker_id, None)
+                pending = self._pending.get(task_id) if task_id is not None else None
+                was_ready = worker_id in self._worker_ready
+                self._worker_ready.discard(worker_id)
+            if pending is not None and not pending[0].done():
+                pending[0].set_exception(
+                    WorkerDied(f"Inference worker {worker_id} exited with code {process.returncode}")
+                )
+            if not was_ready:
+                # It never loaded the model; restarting would fail the same way
+                continue
+            print(f"Inference worker {worker_id} exited with code {process.returncode}, restarting")
+            with self._lock:
+                self.worker_stats[worker_id]["restarts"] += 1
+            self._workers[worker_id] = self._spawn(worker_id)
+
+    def stats(self) -> dict:
+        """Queue depth and per-worker utilisation counters."""
+        uptime = time.monotonic() - self._started_at
+        with self._lock:
+            workers = {
+                worker_id: {
+                    **stats,
+                    "alive": self._workers[worker_id].poll() is None,
+                    "utilisation": stats["busy_seconds"] / uptime if uptime else 0.0,
+                }
+                for worker_id, stats in self.worker_stats.items()
+            }
+            return {
+                "queue_depth": len(self._pending),
+                "workers": workers,
+            }
+
+    def shutdown(self, timeout: float = 30):
+        """Stop the workers once the tasks already queued have been served."""
+        self._closing = True
+        for _ in self._workers:
+            self._task_queue.put(None)
+        for process in self._workers:
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+                process.wait()
+        self._result_queue.put(None)
+        self._queue_server.stop_event.set()
+        # Anything still waiting would otherwise never be answered
+        with self._lock:
+            pending = [future for future, _ in self._pending.values()]
+        for future in pending:
+            if not future.done():
+                future.set_exception(WorkerDied("Inference pool was shut down"))
@@ -0,0 +1,97 @@
+"""
+Entry point of an inference pool worker process.
+
+Started by InferencePool as `python -m routes.inference_worker`, so the worker
+only imports what it needs to run the model and never re-runs the Flask app's
+startup the way a multiprocessing spawn of `python3 app.py` would.
+
+    python -m routes.inference_worker <worker_id> <weights> <threads> <host> <port>
+
+The pool's authkey is read from the INFERENCE_POOL_AUTHKEY environment variable.
+"""
+import os
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+AUTHKEY_ENV = "INFERENCE_POOL_AUTHKEY"
+
+# Modules whose import would mean the worker is re-running the app's startup
+APP_MODULES = ("app", "routes.process")
+
+
+class _PoolQueues(BaseManager):
+    """Client side of the task and result queues served by the pool."""
+
+
+_PoolQueues.register("tasks")
+_PoolQueues.register("results")
+
+
+def _attach(name):
+    segment = shared_memory.SharedMemory(name=name)
+    # The pool owns and unlinks the segment; without this the worker's own
+    # resource tracker would unlink it again when the worker exits
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def serve(worker_id, weights, threads, task_queue, result_queue):
+    """Load the model once, then serve frames from shared memory until a None task arrives."""
+    from ultralytics import YOLO
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    model = YOLO(weights, task="detect")
+    imported = [name for name in APP_MODULES if name in sys.modules]
+    if imported:
+        raise RuntimeError(f"Inference worker imported {', '.join(imported)}")
+    result_queue.put(("ready", worker_id, dict(model.names)))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, frames = task
+        result_queue.put(("start", worker_id, task_id))
+        started = time.monotonic()
+        segments = []
+        try:
+            images = []
+            for name, shape, dtype in frames:
+                segment = _attach(name)
+                segments.append(segment)
+                images.append(np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+
+            payload = []
+            for result in model(images):
+                boxes = result.boxes
+                payload.append((
+                    boxes.xyxy.cpu().numpy(),
+                    boxes.conf.cpu().numpy(),
+                    boxes.cls.cpu().numpy(),
+                ))
+            del images
+            result_queue.put(("done", worker_id, task_id, time.monotonic() - started, payload, None))
+        except Exception as e:
+            result_queue.put(("done", worker_id, task_id, time.monotonic() - started, None, str(e)))
+        finally:
+            for segment in segments:
+                segment.close()
+
+
+def main(argv):
+    worker_id, weights, threads, host, port = argv
+    queues = _PoolQueues(address=(host, int(port)), authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    queues.connect()
+    serve(int(worker_id), weights, int(threads), queues.tasks(), queues.results())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
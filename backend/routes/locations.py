@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Resolved addresses are kept for ADDRESS_CACHE_TTL seconds, up to ADDRESS_CACHE_SIZE entries
+ADDRESS_CACHE_SIZE = int(os.getenv("ADDRESS_CACHE_SIZE", "1000"))
+ADDRESS_CACHE_TTL = float(os.getenv("ADDRESS_CACHE_TTL", str(24 * 3600)))
+
+
+def normalise_location(location: str) -> str:
+    """Lower-case a location and collapse its whitespace and punctuation spacing."""
+    return " ".join(location.replace(",", " ").split()).lower()
+
+
+class AddressCache:
+    """
+    Process-wide LRU of location resolutions, keyed by normalised location.
+
+    Each scraper backend keeps its own instance, holding whatever it resolved
+    a location to: the address text the site's autocomplete settled on, or
+    the form fields the HTTP backend submits.
+    """
+
+    def __init__(self, max_entries: int = ADDRESS_CACHE_SIZE, ttl_seconds: float = ADDRESS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, location: str):
+        key = normalise_location(location)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, location: str, resolution):
+        key = normalise_location(location)
+        with self._lock:
+            self._entries[key] = (resolution, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
@@ -0,0 +1,57 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from concurrent request threads and runs them
+    through a single batched call.
+
+    The first queued item opens a batch window; every item that arrives before
+    the window closes (or until max_batch_size is reached) is processed in the
+    same call to batch_fn, which must return one result per input item.
+    """
+
+    def __init__(self, batch_fn, window_ms: float = 10, max_batch_size: int = 8):
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, item, timeout: float = None):
+        """Queue an item and block until its batched result is available."""
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first item, then gather more until the window closes."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                print(f"Error running batch of {len(items)}: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
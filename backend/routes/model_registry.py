@@ -0,0 +1,150 @@
+import threading
+import time
+
+import numpy as np
+
+
+class ModelNotReady(Exception):
+    """Raised when a prediction is requested before any model has been activated."""
+
+
+class ModelRegistry:
+    """
+    Holds the active detector and swaps in new versions without downtime.
+
+    New versions are loaded and warmed up on a background thread, then made
+    active with a single reference swap. Requests that already picked up the
+    previous model finish on it; the previous model is released once the last
+    of them has returned.
+
+    loader(version) returns a model, predict(model, images) runs it on a list
+    of images, and on_swap(version) is called after every activation.
+    """
+
+    def __init__(self, loader, predict, input_size: int = 640, warmup_runs: int = 2,
+                 warmup_batch_size: int = 1, on_swap=None):
+        self.loader = loader
+        self._predict = predict
+        self.input_size = input_size
+        self.warmup_runs = warmup_runs
+        self.warmup_batch_size = max(1, warmup_batch_size)
+        self.on_swap = on_swap
+        self._active = None
+        self._lock = threading.Lock()
+        # Predictions in flight per model, so a retired model is only shut down once idle
+        self._in_use = {}
+        self._idle = threading.Condition(self._lock)
+        self.loading_version = None
+        self.last_error = None
+        self.activated_at = None
+
+    @property
+    def version(self):
+        active = self._active
+        return active[0] if active else None
+
+    def is_ready(self) -> bool:
+        return self._active is not None
+
+    def predict(self, images):
+        """Run images through the active model, whichever it is when called."""
+        with self._lock:
+            active = self._active
+            if active is None:
+                raise ModelNotReady("Model is still loading")
+            model = active[1]
+            self._in_use[id(model)] = self._in_use.get(id(model), 0) + 1
+        try:
+            return self._predict(model, images)
+        finally:
+            with self._lock:
+                self._in_use[id(model)] -= 1
+                if not self._in_use[id(model)]:
+                    del self._in_use[id(model)]
+                    self._idle.notify_all()
+
+    @property
+    def model(self):
+        """The active model, or None while the first version is loading."""
+        active = self._active
+        return active[1] if active else None
+
+    def load(self, version: str):
+        """Load, warm up and activate a model version on the calling thread."""
+        with self._lock:
+            self.loading_version = version
+            self.last_error = None
+        model = None
+        try:
+            print(f"Loading model {version}...")
+            started = time.monotonic()
+            model = self.loader(version)
+            self._warm_up(model)
+            print(f"Model {version} loaded and warmed up in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            print(f"Error loading model {version}: {str(e)}")
+            if model is not None and hasattr(model, "shutdown"):
+                model.shutdown(timeout=0)
+            with self._lock:
+                self.loading_version = None
+                self.last_error = str(e)
+            raise
+
+        with self._lock:
+            previous = self._active
+            self._active = (version, model)
+            self.loading_version = None
+            self.activated_at = time.time()
+
+        if self.on_swap:
+            self.on_swap(version)
+        if previous and hasattr(previous[1], "shutdown"):
+            threading.Thread(target=self._retire, args=(previous[1],), name="model-retire", daemon=True).start()
+
+    def _retire(self, model):
+        """Shut a replaced model down after every prediction that picked it up has returned."""
+        with self._lock:
+            self._idle.wait_for(lambda: id(model) not in self._in_use)
+        model.shutdown()
+
+    def load_async(self, version: str) -> bool:
+        """
+        Start loading a model version in the background.
+
+        Returns False if another version is already being loaded.
+        """
+        with self._lock:
+            if self.loading_version is not None:
+                return False
+            self.loading_version = version
+
+        def run():
+            try:
+                self.load(version)
+            except Exception:
+                pass
+
+        threading.Thread(target=run, name="model-loader", daemon=True).start()
+        return True
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self._active is not None,
+                "version": self._active[0] if self._active else None,
+                "activated_at": self.activated_at,
+                "loading": self.loading_version,
+                "last_error": self.last_error,
+            }
+
+    def _warm_up(self, model):
+        """Run synthetic frames through a model so lazy initialisation happens before it serves traffic."""
+        rng = np.random.default_rng(0)
+        frames = [
+            np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8),
+            rng.integers(0, 256, (self.input_size, self.input_size, 3), dtype=np.uint8),
+        ]
+        for run in range(self.warmup_runs):
+            self._predict(model, [frames[run % len(frames)]])
+        if self.warmup_batch_size > 1:
+            self._predict(model, [frames[i % len(frames)] for i in range(self.warmup_batch_size)])
@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from langchain_community.chat_models import ChatOpenAI
 from langchain.schema import HumanMessage
 from dotenv import load_dotenv
+from extensions import metrics
 
 # Load environment variables from .env
 load_dotenv()
@@ -28,7 +29,8 @@ def generate_text():
 
     try:
         # Generate response using ChatOpenAI
-        response = chat_model([HumanMessage(content=prompt)])
+        with metrics.span("llm_call"):
+            response = chat_model([HumanMessage(content=prompt)])
         
         # Extract generated content
         generated_text = response.content.strip()
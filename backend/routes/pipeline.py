@@ -0,0 +1,82 @@
+from flask import Blueprint, request, jsonify
+from flask_cors import CORS
+
+from .model_registry import ModelNotReady
+from .preprocess import ImageTooLarge
+from .process import ImageDecodeError, detect_image, detection_options
+from .product_names import resolve_product
+from .scraper import (
+    RESULTS_MAX_TOP_N, RESULTS_TOP_N, SCRAPER_ITEM_TIMEOUT, encode_event, needs_scrape, prepare_executor,
+    prepare_location, scrape_jobs, stream_job, stream_response,
+)
+
+# Define the blueprint
+pipeline_bp = Blueprint('pipeline_bp', __name__)
+CORS(pipeline_bp)  # Enable CORS for all routes in this blueprint
+
+
+def _price_options(form):
+    """top_n and include_all from form fields; raises ValueError for malformed values."""
+    top_n = int(form.get('top_n', RESULTS_TOP_N))
+    if not 1 <= top_n <= RESULTS_MAX_TOP_N:
+        raise ValueError(f"top_n must be between 1 and {RESULTS_MAX_TOP_N}")
+    return {'top_n': top_n, 'include_all': form.get('include_all', 'false').lower() == 'true'}
+
+
+@pipeline_bp.route('/detect-and-price', methods=['POST'])
+def detect_and_price():
+    """
+    Detect produce in an uploaded image and look up prices for it in one request.
+
+    Once detection is done, a scraper session for location is prepared only
+    if a detected product has to be scraped, and price lookups start without
+    waiting for it. The response streams a 'detections' record first, then
+    one 'result' record per detected product as its price arrives, then a
+    'summary' record, as NDJSON or SSE like /api/scrape/stream.
+    """
+    if 'image' not in request.files:
+        return jsonify({"error": "No image provided"}), 400
+    location = request.form.get('location')
+    if not location:
+        return jsonify({"error": "location is required"}), 400
+
+    try:
+        options = detection_options(request.form)
+        price_options = _price_options(request.form)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid options: {str(e)}"}), 400
+
+    try:
+        detections, cache_status = detect_image(request.files['image'].read(), options)
+    except ImageTooLarge as e:
+        print(f"Rejected image: {str(e)}")
+        return jsonify({"error": "Image too large"}), 413
+    except ImageDecodeError:
+        return jsonify({"error": "Failed to decode image"}), 400
+    except ModelNotReady:
+        return jsonify({"error": "Model is loading"}), 503
+    except Exception as e:
+        print(f"Error processing image: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    # Copies, since cached detections are shared with /process-image
+    detections = [{**detection, "product": resolve_product(detection["label"])} for detection in detections]
+    products = []
+    for detection in detections:
+        if detection["product"] and detection["product"] not in products:
+            products.append(detection["product"])
+
+    # No browser is needed when nothing was detected or every price is already cached
+    if any(needs_scrape(location, product) for product in products):
+        prepare_executor.submit(prepare_location, location)
+
+    def stream(fmt):
+        # Detections go out before any price lookup waits on the scraper
+        yield encode_event(fmt, 'detections', {'detections': detections, 'products': products, 'cache': cache_status})
+
+        # Not gated on the warm-up: cached prices need no session, and searches
+        # pick up the prepared one if it is back in the pool by the time they run
+        job = scrape_jobs.submit(location, products, **price_options)
+        yield from stream_job(job, fmt, SCRAPER_ITEM_TIMEOUT)
+
+    return stream_response(stream)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from .preprocess import scale_boxes
+
+
+def _to_numpy(values):
+    """Convert a torch tensor or array-like to a NumPy array."""
+    if hasattr(values, "cpu"):
+        return values.cpu().numpy()
+    return np.asarray(values)
+
+
+def select_detections(result, transform, top_k: int = 1, min_confidence: float = 0.0, classes=None):
+    """
+    Pick the top_k most confident detections of a YOLO result in one pass over
+    its box tensors.
+
+    Boxes at or below min_confidence, and boxes whose label isn't in classes
+    (when given), are dropped before anything is converted to Python objects.
+    Results are sorted by confidence, highest first, with boxes mapped back to
+    the original image space with transform.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+
+    conf = _to_numpy(boxes.conf).reshape(-1)
+    cls = _to_numpy(boxes.cls).reshape(-1).astype(np.int64)
+
+    mask = conf > min_confidence
+    if classes is not None:
+        allowed = [index for index, name in result.names.items() if name in classes]
+        mask &= np.isin(cls, allowed)
+
+    candidates = np.flatnonzero(mask)
+    if candidates.size == 0:
+        return []
+
+    if top_k == 1:
+        selected = candidates[[np.argmax(conf[candidates])]]
+    else:
+        if top_k < candidates.size:
+            candidates = candidates[np.argpartition(-conf[candidates], top_k - 1)[:top_k]]
+        selected = candidates[np.argsort(-conf[candidates], kind="stable")]
+
+    xyxy = scale_boxes(_to_numpy(boxes.xyxy)[selected], transform)
+    return [
+        {
+            "label": result.names[int(label_index)],
+            "box": box,
+            "confidence": float(confidence),
+        }
+        for label_index, box, confidence in zip(cls[selected], xyxy.tolist(), conf[selected])
+    ]
@@ -0,0 +1,141 @@
+import struct
+
+import cv2
+import numpy as np
+
+# Reduced decode modes, from the most to the least aggressive
+REDUCED_MODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG start-of-frame markers that carry the image dimensions
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ImageTooLarge(Exception):
+    """Raised when an upload exceeds the configured pixel budget."""
+
+
+def read_image_size(data: bytes):
+    """
+    Read (width, height) from a JPEG or PNG header without decoding.
+
+    Returns None for other formats or malformed headers.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        segment_length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + segment_length
+    return None
+
+
+def check_image_size(data: bytes, max_pixels: int = None):
+    """
+    Raise ImageTooLarge if the header reports more than max_pixels.
+
+    Returns the (width, height) read from the header, or None if unknown.
+    """
+    size = read_image_size(data)
+    if size and max_pixels and size[0] * size[1] > max_pixels:
+        raise ImageTooLarge(f"Image of {size[0]}x{size[1]} exceeds {max_pixels} pixels")
+    return size
+
+
+def _decode_flag(size, input_size: int):
+    """Pick the most reduced decode that still covers the model input size."""
+    if size:
+        longest = max(size)
+        for factor, flag in REDUCED_MODES:
+            if longest // factor >= input_size:
+                return flag
+    return cv2.IMREAD_COLOR
+
+
+def prepare_image(data: bytes, input_size: int = 640, max_pixels: int = None):
+    """
+    Decode an upload straight to a letterboxed model input.
+
+    Returns (image, transform), or (None, None) if the bytes can't be decoded.
+    The transform maps boxes back to the original image with scale_boxes().
+    Raises ImageTooLarge before decoding when the header exceeds max_pixels.
+    """
+    # cv2.imdecode raises rather than returning None on an empty buffer
+    if not data:
+        return None, None
+
+    size = check_image_size(data, max_pixels)
+
+    try:
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), _decode_flag(size, input_size))
+    except cv2.error:
+        img = None
+    if img is None:
+        return None, None
+
+    decoded_h, decoded_w = img.shape[:2]
+    if size:
+        orig_w, orig_h = size
+        # EXIF orientation may have rotated the decoded image relative to the header
+        if (decoded_h > decoded_w) != (orig_h > orig_w):
+            orig_w, orig_h = orig_h, orig_w
+    else:
+        orig_w, orig_h = decoded_w, decoded_h
+        if max_pixels and orig_w * orig_h > max_pixels:
+            raise ImageTooLarge(f"Image of {orig_w}x{orig_h} exceeds {max_pixels} pixels")
+
+    # Letterbox: resize the longest side to input_size and pad the rest with grey
+    scale = min(input_size / decoded_w, input_size / decoded_h)
+    new_w, new_h = int(round(decoded_w * scale)), int(round(decoded_h * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(img, (new_w, new_h), interpolation=interpolation)
+
+    pad_x = (input_size - new_w) // 2
+    pad_y = (input_size - new_h) // 2
+    letterboxed = np.full((input_size, input_size, 3), 114, dtype=np.uint8)
+    letterboxed[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+
+    transform = {
+        "scale_x": scale * decoded_w / orig_w,
+        "scale_y": scale * decoded_h / orig_h,
+        "pad_x": pad_x,
+        "pad_y": pad_y,
+        "width": orig_w,
+        "height": orig_h,
+    }
+    return letterboxed, transform
+
+
+def scale_boxes(xyxy, transform):
+    """Map an (N, 4) array of xyxy boxes from model input space back to the original image."""
+    boxes = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4).copy()
+    xs, ys = boxes[:, 0::2], boxes[:, 1::2]
+    xs -= transform["pad_x"]
+    xs /= transform["scale_x"]
+    ys -= transform["pad_y"]
+    ys /= transform["scale_y"]
+    np.clip(xs, 0, transform["width"], out=xs)
+    np.clip(ys, 0, transform["height"], out=ys)
+    return boxes
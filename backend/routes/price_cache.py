@@ -0,0 +1,219 @@
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from .locations import normalise_location
+
+
+def cache_key(location: str, product_name: str) -> str:
+    return f"{normalise_location(location)}|{product_name.strip().lower()}"
+
+
+class PriceCache:
+    """
+    Mongo-backed cache of search_product results with stale-while-revalidate.
+
+    Entries younger than fresh_seconds are served as they are. Older entries
+    are still served immediately while a background refresh runs, until
+    max_age_seconds, after which a TTL index removes them. Only misses call
+    the fetch function on the request path. At most max_refreshes background
+    refreshes are queued or running at once; stale hits beyond that are served
+    without one.
+
+    Entries stored by warm() are marked with the warming run that stored them
+    and count the requests they serve; refreshes keep those marks, so the
+    counts cover the entry's whole life. Those counts are buffered in memory
+    and written by flush_served(), off the request path.
+    """
+
+    def __init__(self, collection_getter, fresh_seconds: float, max_age_seconds: float, refresh_executor,
+                 max_refreshes: int = 8):
+        self._collection_getter = collection_getter
+        self.fresh_seconds = fresh_seconds
+        self.max_age_seconds = max(max_age_seconds, fresh_seconds)
+        self.refresh_executor = refresh_executor
+        self.max_refreshes = max(1, max_refreshes)
+        self._refreshing = set()
+        # (entry key, warming run) -> requests served since the last flush_served()
+        self._served = Counter()
+        self._lock = threading.Lock()
+        self._indexes_ready = False
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "refreshes_skipped": 0, "errors": 0, "warmed_hits": 0}
+
+    @property
+    def collection(self):
+        collection = self._collection_getter()
+        if not self._indexes_ready:
+            # Entries are dropped by Mongo once they are too old to serve even stale
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexes_ready = True
+        return collection
+
+    def get(self, location: str, product_name: str, fetch):
+        """
+        Return the result for (location, product_name), calling fetch() on a miss.
+
+        The returned dict carries a 'cache' field: hit, stale or miss.
+        """
+        key = cache_key(location, product_name)
+        try:
+            doc = self.collection.find_one({"_id": key})
+        except Exception as e:
+            print(f"Error reading price cache: {str(e)}")
+            self._count("errors")
+            doc = None
+
+        if doc:
+            age = (datetime.utcnow() - doc["fetched_at"]).total_seconds()
+            if age < self.fresh_seconds:
+                self._count("hits")
+                self._count_warmed_hit(doc)
+                return {**doc["result"], "cache": "hit"}
+            if age < self.max_age_seconds:
+                self._count("stale")
+                self._count_warmed_hit(doc)
+                self._refresh_in_background(key, location, product_name, fetch)
+                return {**doc["result"], "cache": "stale"}
+
+        self._count("misses")
+        result = fetch()
+        self._store(key, location, product_name, result)
+        return {**result, "cache": "miss"}
+
+    def age(self, location: str, product_name: str):
+        """Seconds since (location, product_name) was last scraped, or None if it is not cached."""
+        doc = self.collection.find_one({"_id": cache_key(location, product_name)}, {"fetched_at": 1})
+        return (datetime.utcnow() - doc["fetched_at"]).total_seconds() if doc else None
+
+    def warm(self, location: str, product_name: str, fetch, run_id: str = None) -> dict:
+        """Scrape and store (location, product_name) ahead of demand, marking the entry as warmed by run_id."""
+        result = fetch()
+        self._store(cache_key(location, product_name), location, product_name, result,
+                    marks={"warmed": True, "warm_run": run_id, "served": 0})
+        return result
+
+    def warming_report(self) -> dict:
+        """How many warmed entries are still cached and how many of them have served a request."""
+        totals = list(self.collection.aggregate([
+            {"$match": {"warmed": True}},
+            {"$group": {
+                "_id": None,
+                "entries": {"$sum": 1},
+                "served_entries": {"$sum": {"$cond": [{"$gt": ["$served", 0]}, 1, 0]}},
+                "served_requests": {"$sum": "$served"},
+            }},
+        ]))
+        totals = totals[0] if totals else {"entries": 0, "served_entries": 0, "served_requests": 0}
+        return {
+            "warmed_entries": totals["entries"],
+            "warmed_entries_served": totals["served_entries"],
+            "warmed_requests_served": totals["served_requests"],
+            "warmed_entry_hit_rate": totals["served_entries"] / totals["entries"] if totals["entries"] else 0.0,
+        }
+
+    def _count_warmed_hit(self, doc):
+        if not doc.get("warmed"):
+            return
+        with self._lock:
+            self.stats["warmed_hits"] += 1
+            self._served[(doc["_id"], doc.get("warm_run"))] += 1
+
+    def flush_served(self) -> dict:
+        """
+        Add the buffered warmed-entry hits to the entries' served counts.
+
+        Returns {run_id: {"requests": n, "entries": m}}, where entries counts
+        the entries that served their first request. Hits on an entry that
+        has since expired or been warmed by another run are dropped.
+        """
+        with self._lock:
+            served, self._served = self._served, Counter()
+        runs = {}
+        for (key, run_id), count in served.items():
+            try:
+                before = self.collection.find_one_and_update(
+                    {"_id": key, "warm_run": run_id},
+                    {"$inc": {"served": count}},
+                    projection={"served": 1},
+                    return_document=ReturnDocument.BEFORE,
+                )
+            except Exception as e:
+                print(f"Error updating warmed cache entry: {str(e)}")
+                with self._lock:
+                    self._served[(key, run_id)] += count
+                continue
+            if before is None or run_id is None:
+                continue
+            totals = runs.setdefault(run_id, {"requests": 0, "entries": 0})
+            totals["requests"] += count
+            # Read and incremented atomically, so concurrent first hits count the entry once
+            if not before.get("served"):
+                totals["entries"] += 1
+        return runs
+
+    def _refresh_in_background(self, key, location, product_name, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            if len(self._refreshing) >= self.max_refreshes:
+                self.stats["refreshes_skipped"] += 1
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                # Keeps the entry's warming marks and served count
+                self._store(key, location, product_name, fetch(), keep_marks=True)
+                self._count("refreshes")
+            except Exception as e:
+                print(f"Error refreshing cached price for {product_name}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self.refresh_executor.submit(refresh)
+
+    def _store(self, key, location, product_name, result, marks=None, keep_marks=False):
+        """
+        Upsert a successful result.
+
+        marks (default: not warmed) replace the entry's warming marks, or with
+        keep_marks only apply if the entry is new.
+        """
+        # Errors are not cached so the next request retries the site
+        if result.get("status") != "success":
+            return
+        marks = marks or {"warmed": False, "warm_run": None, "served": 0}
+        now = datetime.utcnow()
+        fields = {
+            "location": normalise_location(location),
+            "product": product_name,
+            "result": result,
+            "fetched_at": now,
+            "expires_at": now + timedelta(seconds=self.max_age_seconds),
+        }
+        if keep_marks:
+            update = {"$set": fields, "$setOnInsert": marks}
+        else:
+            update = {"$set": {**fields, **marks}}
+        try:
+            self.collection.update_one({"_id": key}, update, upsert=True)
+        except Exception as e:
+            print(f"Error writing price cache: {str(e)}")
+            self._count("errors")
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["stale"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": (self.stats["hits"] + self.stats["stale"]) / lookups if lookups else 0.0,
+                "fresh_seconds": self.fresh_seconds,
+                "max_age_seconds": self.max_age_seconds,
+            }
@@ -0,0 +1,205 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from .locations import normalise_location
+
+
+def _day_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+class PriceHistory:
+    """
+    Time series of every scraped store price, with daily rollups.
+
+    record() buffers rows and writes them with insert_many once batch_size
+    rows are pending or flush_interval seconds have passed. Rows go to a
+    Mongo time-series collection (a regular indexed collection on servers
+    without time-series support). rollup() summarises a day per product and
+    region (the normalised searched location) into the rollups collection,
+    which query() reads, so its cost depends only on the number of days
+    asked for.
+    """
+
+    def __init__(self, db_getter, collection_name: str = "price_history", rollups_name: str = "price_rollups",
+                 batch_size: int = 500, flush_interval: float = 10, rollup_interval: float = 900):
+        self._db_getter = db_getter
+        self.collection_name = collection_name
+        self.rollups_name = rollups_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rollup_interval = rollup_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._ready = False
+        self._thread = None
+        self.stats = {"recorded": 0, "written": 0, "errors": 0, "rollups": 0}
+
+    def _collections(self):
+        db = self._db_getter()
+        if not self._ready:
+            try:
+                db.create_collection(
+                    self.collection_name,
+                    timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+                )
+            except CollectionInvalid:
+                pass  # Already exists
+            except OperationFailure as e:
+                print(f"Time-series collections unavailable, using a regular collection: {str(e)}")
+            db[self.collection_name].create_index([("meta.product", ASCENDING), ("ts", ASCENDING)])
+            db[self.rollups_name].create_index([("product", ASCENDING), ("day", ASCENDING)])
+            self._ready = True
+        return db[self.collection_name], db[self.rollups_name]
+
+    def record(self, location: str, product_name: str, rows):
+        """Queue every priced row of one search's results table."""
+        now = datetime.utcnow()
+        region = normalise_location(location)
+        docs = [
+            {
+                "ts": now,
+                "meta": {
+                    "product": product_name,
+                    "region": region,
+                    "chain": row["store_chain"],
+                    "branch": row["store_name"],
+                },
+                "price": row["price"],
+            }
+            for row in rows if row["price"] != float("inf")
+        ]
+        with self._lock:
+            self._pending.extend(docs)
+            self.stats["recorded"] += len(docs)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            history, _ = self._collections()
+            history.insert_many(pending, ordered=False)
+            with self._lock:
+                self.stats["written"] += len(pending)
+        except Exception as e:
+            print(f"Error writing price history: {str(e)}")
+            with self._lock:
+                self.stats["errors"] += 1
+
+    def rollup(self, day: datetime) -> int:
+        """(Re)compute the rollups of the UTC day containing day; returns how many were written."""
+        start = _day_start(day)
+        history, rollups = self._collections()
+        groups = history.aggregate([
+            {"$match": {"ts": {"$gte": start, "$lt": start + timedelta(days=1)}}},
+            {"$sort": {"price": ASCENDING}},
+            {"$group": {
+                "_id": {"product": "$meta.product", "region": "$meta.region"},
+                "prices": {"$push": "$price"},
+                "cheapest_chain": {"$first": "$meta.chain"},
+                "cheapest_branch": {"$first": "$meta.branch"},
+            }},
+        ], allowDiskUse=True)
+
+        written = 0
+        for group in groups:
+            product, region = group["_id"]["product"], group["_id"]["region"]
+            prices = group["prices"]
+            rollups.replace_one(
+                {"_id": f"{product}|{region}|{start.date().isoformat()}"},
+                {
+                    "product": product,
+                    "region": region,
+                    "day": start,
+                    "min": prices[0],
+                    "median": _median(prices),
+                    "max": prices[-1],
+                    "samples": len(prices),
+                    "cheapest_chain": group["cheapest_chain"],
+                    "cheapest_branch": group["cheapest_branch"],
+                },
+                upsert=True,
+            )
+            written += 1
+        with self._lock:
+            self.stats["rollups"] += written
+        return written
+
+    def query(self, product_name: str, location: str = None, days: int = 7) -> dict:
+        """Cheapest price and daily min/median trend of product_name over the last days."""
+        _, rollups = self._collections()
+        since = _day_start(datetime.utcnow()) - timedelta(days=days - 1)
+        criteria = {"product": product_name, "day": {"$gte": since}}
+        if location:
+            criteria["region"] = normalise_location(location)
+
+        daily = {}
+        cheapest = None
+        for doc in rollups.find(criteria, {"_id": 0}).sort("day", ASCENDING):
+            if cheapest is None or doc["min"] < cheapest["price"]:
+                cheapest = {
+                    "price": doc["min"],
+                    "chain": doc["cheapest_chain"],
+                    "branch": doc["cheapest_branch"],
+                    "region": doc["region"],
+                    "day": doc["day"].date().isoformat(),
+                }
+            # Across regions, a day's figures are the lowest of its regions' figures
+            key = doc["day"].date().isoformat()
+            entry = daily.setdefault(key, {"day": key, "min": doc["min"], "median": doc["median"]})
+            entry["min"] = min(entry["min"], doc["min"])
+            entry["median"] = min(entry["median"], doc["median"])
+
+        trend = list(daily.values())
+        change = trend[-1]["median"] - trend[0]["median"] if len(trend) > 1 else 0.0
+        return {
+            "product": product_name,
+            "region": normalise_location(location) if location else None,
+            "days": days,
+            "cheapest": cheapest,
+            "trend": trend,
+            "median_change": round(change, 2),
+        }
+
+    def start(self):
+        """Start the background thread that flushes rows and keeps today's and yesterday's rollups current."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._maintain, name="price-history", daemon=True)
+            self._thread.start()
+
+    def _maintain(self):
+        last_rollup = 0.0
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            if time.monotonic() - last_rollup < self.rollup_interval:
+                continue
+            last_rollup = time.monotonic()
+            now = datetime.utcnow()
+            # Yesterday is redone too so rows flushed just after midnight are counted
+            for day in (now - timedelta(days=1), now):
+                try:
+                    self.rollup(day)
+                except Exception as e:
+                    print(f"Error computing price rollups: {str(e)}")
+
+    def status(self) -> dict:
+        with self._lock:
+            return {**self.stats, "pending": len(self._pending)}
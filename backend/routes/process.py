@@ -1,10 +1,249 @@
-from ultralytics import YOLO
-import cv2
-import numpy as np
+import os
 from flask import Blueprint, request, jsonify
+from extensions import metrics
+from .micro_batcher import MicroBatcher
+from .inference_pool import InferencePool
+from .detection_cache import DetectionCache, content_key, perceptual_hash
+from .preprocess import ImageTooLarge, check_image_size, prepare_image
+from .postprocess import select_detections
+from .detector_backends import load_detector, resolve_weights
+from .model_registry import ModelRegistry, ModelNotReady
+from .stream_tracker import SessionStore, tracking_frame
 process_bp = Blueprint('process_bp', __name__)
 
-model = YOLO('yolo11s.pt')
+MODEL_WEIGHTS = os.getenv("MODEL_WEIGHTS", "yolo11s.pt")
+
+# Inference backend: pytorch, onnx, onnx-int8, openvino or openvino-int8.
+# Non-PyTorch backends are exported from MODEL_WEIGHTS on first start.
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "pytorch")
+DETECTION_INPUT_SIZE = int(os.getenv("DETECTION_INPUT_SIZE", "640"))
+
+# With DETECTION_WORKERS > 0 the model is loaded only in dedicated inference processes,
+# each limited to DETECTION_WORKER_THREADS torch threads (0 keeps the torch default)
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "0"))
+DETECTION_WORKER_THREADS = int(os.getenv("DETECTION_WORKER_THREADS", "0"))
+# Longest a request waits for its detection; a dead or stuck worker fails the request instead of hanging it
+DETECTION_TIMEOUT = float(os.getenv("DETECTION_TIMEOUT", "60"))
+
+
+# Model loading: versions are loaded and warmed up in the background, so the app
+# starts serving immediately and /ready reports when detection is available
+MODEL_LOAD_TIMEOUT = float(os.getenv("MODEL_LOAD_TIMEOUT", "300"))
+MODEL_WARMUP_RUNS = int(os.getenv("MODEL_WARMUP_RUNS", "2"))
+# Set to false to start without a model, e.g. to load one later through /admin/model
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "true").lower() == "true"
+
+# Streaming detection: the model runs every STREAM_KEYFRAME_INTERVAL frames or when the
+# mean grey-level change against the last keyframe exceeds STREAM_SCENE_CHANGE_THRESHOLD;
+# boxes are tracked with optical flow in between
+STREAM_KEYFRAME_INTERVAL = int(os.getenv("STREAM_KEYFRAME_INTERVAL", "10"))
+STREAM_SCENE_CHANGE_THRESHOLD = float(os.getenv("STREAM_SCENE_CHANGE_THRESHOLD", "12"))
+STREAM_SESSION_TTL = float(os.getenv("STREAM_SESSION_TTL", "60"))
+STREAM_MAX_SESSIONS = int(os.getenv("STREAM_MAX_SESSIONS", "100"))
+
+stream_sessions = SessionStore(STREAM_SESSION_TTL, STREAM_MAX_SESSIONS)
+
+# Token required in the X-Admin-Token header to switch models; admin routes are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Uploads are decoded at reduced resolution and letterboxed to DETECTION_INPUT_SIZE;
+# anything above DETECTION_MAX_PIXELS is rejected before decoding
+DETECTION_MAX_PIXELS = int(os.getenv("DETECTION_MAX_PIXELS", "50000000"))
+
+# Labels kept when a request asks for produce_only; override with a comma-separated list
+DETECTION_PRODUCE_CLASSES = frozenset(
+    name.strip() for name in os.getenv("DETECTION_PRODUCE_CLASSES", "apple,banana,orange,broccoli,carrot").split(",")
+    if name.strip()
+)
+
+# Micro-batching settings: concurrent single-image requests are grouped for up to
+# DETECTION_BATCH_WINDOW_MS and run as one model call of at most DETECTION_MAX_BATCH_SIZE
+DETECTION_MICRO_BATCHING = os.getenv("DETECTION_MICRO_BATCHING", "false").lower() == "true"
+DETECTION_BATCH_WINDOW_MS = float(os.getenv("DETECTION_BATCH_WINDOW_MS", "10"))
+DETECTION_MAX_BATCH_SIZE = int(os.getenv("DETECTION_MAX_BATCH_SIZE", "8"))
+# Most images accepted in one /process-image-batch request
+DETECTION_MAX_BATCH_IMAGES = int(os.getenv("DETECTION_MAX_BATCH_IMAGES", "32"))
+
+# Detection result cache: exact content hash by default, "perceptual" also matches near-duplicates
+DETECTION_CACHE_ENABLED = os.getenv("DETECTION_CACHE", "true").lower() == "true"
+DETECTION_CACHE_MODE = os.getenv("DETECTION_CACHE_MODE", "exact")
+DETECTION_CACHE_MAX_BYTES = int(os.getenv("DETECTION_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+DETECTION_CACHE_TTL = float(os.getenv("DETECTION_CACHE_TTL", "3600"))
+DETECTION_CACHE_PHASH_DISTANCE = int(os.getenv("DETECTION_CACHE_PHASH_DISTANCE", "4"))
+
+detection_cache = DetectionCache(
+    DETECTION_CACHE_MAX_BYTES,
+    DETECTION_CACHE_TTL,
+    phash_distance=DETECTION_CACHE_PHASH_DISTANCE if DETECTION_CACHE_MODE == "perceptual" else None,
+) if DETECTION_CACHE_ENABLED else None
+
+
+def _load_model(weights: str):
+    """Load a model version in-process, or as a pool of inference workers."""
+    if DETECTION_WORKERS <= 0:
+        return load_detector(weights, DETECTOR_BACKEND, DETECTION_INPUT_SIZE)
+
+    # Export once here so the workers don't race each other to do it
+    model_path = resolve_weights(weights, DETECTOR_BACKEND, DETECTION_INPUT_SIZE)
+    pool = InferencePool(model_path, DETECTION_WORKERS, threads=DETECTION_WORKER_THREADS,
+                         task_timeout=DETECTION_TIMEOUT)
+    if not pool.wait_ready(MODEL_LOAD_TIMEOUT):
+        pool.shutdown(timeout=0)
+        raise TimeoutError(f"Inference workers did not load {weights} within {MODEL_LOAD_TIMEOUT}s")
+    return pool
+
+
+def _predict(model, images):
+    if isinstance(model, InferencePool):
+        return model.predict(images)
+    return model(images)
+
+
+def _on_model_swap(version):
+    # Cached detections came from the previous model
+    if detection_cache:
+        detection_cache.clear()
+
+
+registry = ModelRegistry(
+    _load_model,
+    _predict,
+    input_size=DETECTION_INPUT_SIZE,
+    warmup_runs=MODEL_WARMUP_RUNS,
+    warmup_batch_size=DETECTION_MAX_BATCH_SIZE if DETECTION_MICRO_BATCHING else 1,
+    on_swap=_on_model_swap,
+)
+if MODEL_PRELOAD:
+    registry.load_async(MODEL_WEIGHTS)
+
+metrics.register_gauge(
+    "fruitlens_detection_cache", "Detection cache entries, bytes, hits and misses",
+    lambda: detection_cache.stats() if detection_cache else None,
+)
+metrics.register_gauge(
+    "fruitlens_inference_queue_depth", "Frames waiting on the inference worker pool",
+    lambda: registry.model.stats()["queue_depth"] if isinstance(registry.model, InferencePool) else None,
+)
+
+
+def _run_model_batch(images):
+    """Run the detector on a list of images, returning one result per image."""
+    results = []
+    for start in range(0, len(images), DETECTION_MAX_BATCH_SIZE):
+        with metrics.span("yolo_inference"):
+            results.extend(registry.predict(images[start:start + DETECTION_MAX_BATCH_SIZE]))
+    return results
+
+
+batcher = MicroBatcher(
+    _run_model_batch,
+    window_ms=DETECTION_BATCH_WINDOW_MS,
+    max_batch_size=DETECTION_MAX_BATCH_SIZE,
+) if DETECTION_MICRO_BATCHING else None
+
+
+def _detect(img):
+    """Run detection for a single image, through the micro-batcher when enabled."""
+    if batcher:
+        return batcher.submit(img, timeout=DETECTION_TIMEOUT)
+    return _run_model_batch([img])[0]
+
+
+def _decode_image(data: bytes):
+    """
+    Decode uploaded bytes into a letterboxed model input.
+
+    Returns (image, transform), or (None, None) if the bytes can't be decoded.
+    """
+    with metrics.span("image_decode"):
+        return prepare_image(data, DETECTION_INPUT_SIZE, DETECTION_MAX_PIXELS)
+
+
+def detection_options(form):
+    """
+    Parse detection options from the request form.
+
+    top_k (default 1) limits how many detections are returned, min_confidence
+    drops weaker boxes, classes is a comma-separated label allow-list and
+    produce_only=true restricts results to DETECTION_PRODUCE_CLASSES.
+    Raises ValueError for malformed values.
+    """
+    top_k = int(form.get('top_k', 1))
+    min_confidence = float(form.get('min_confidence', 0))
+    if top_k < 1:
+        raise ValueError("top_k must be at least 1")
+    # Written so that nan fails it too
+    if not 0 <= min_confidence <= 1:
+        raise ValueError("min_confidence must be between 0 and 1")
+
+    classes = None
+    if form.get('classes'):
+        classes = frozenset(name.strip() for name in form['classes'].split(",") if name.strip())
+    if form.get('produce_only', 'false').lower() == 'true':
+        classes = DETECTION_PRODUCE_CLASSES if classes is None else classes & DETECTION_PRODUCE_CLASSES
+
+    return {"top_k": top_k, "min_confidence": min_confidence, "classes": classes}
+
+
+def _options_variant(options) -> str:
+    """Stable cache variant string for a set of detection options."""
+    classes = ",".join(sorted(options["classes"])) if options["classes"] is not None else "*"
+    return f"{options['top_k']}|{options['min_confidence']}|{classes}"
+
+
+def _cache_lookup(data: bytes, options):
+    """
+    Look up cached detections for an upload and set of detection options.
+
+    Returns (detections or None, key, phash); key and phash are what the
+    caller should store a fresh result under after a miss. Raises
+    ImageTooLarge before anything is decoded.
+    """
+    # Checked first: the perceptual hash decodes the image
+    size = check_image_size(data, DETECTION_MAX_PIXELS)
+    if not detection_cache:
+        return None, None, None
+    variant = _options_variant(options)
+    key = f"{content_key(data)}:{variant}"
+    detections = detection_cache.get(key)
+    if detections is not None:
+        return detections, key, None
+    # Formats without a readable header could hide any size, so they only get exact matches
+    phash = perceptual_hash(data) if detection_cache.phash_distance is not None and size else None
+    return detection_cache.get_similar(phash, variant), key, phash
+
+
+def _cache_store(key, phash, options, detections):
+    if detection_cache and key:
+        detection_cache.put(key, detections, phash=phash, variant=_options_variant(options))
+
+
+class ImageDecodeError(ValueError):
+    """Raised when uploaded bytes are not a decodable image."""
+
+
+def detect_image(data: bytes, options: dict):
+    """
+    Run detection on one uploaded image, going through the detection cache.
+
+    Returns (detections, "HIT" or "MISS"). Raises ImageTooLarge,
+    ImageDecodeError or ModelNotReady.
+    """
+    # A cache hit skips decoding and inference entirely
+    detections, cache_key, phash = _cache_lookup(data, options)
+    if detections is not None:
+        return detections, "HIT"
+
+    # Convert image to a NumPy array for YOLO processing
+    img, transform = _decode_image(data)
+    if img is None:
+        raise ImageDecodeError("Failed to decode image")
+
+    # Run YOLO object detection on the image and keep the most confident objects
+    detections = select_detections(_detect(img), transform, **options)
+    _cache_store(cache_key, phash, options, detections)
+    return detections, "MISS"
+
 
 @process_bp.route('/process-image', methods=['POST'])
 def process_image():
@@ -19,54 +258,212 @@ def process_image():
         file = request.files['image']
         print(f"Image file received: {file.filename} of type {file.content_type}")  # Log file details
 
-        # Convert image to a NumPy array for YOLO processing
-        npimg = np.frombuffer(file.read(), np.uint8)
-        img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+        try:
+            options = detection_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid detection options: {str(e)}"}), 400
 
-        if img is None:
+        try:
+            detections, cache_status = detect_image(file.read(), options)
+        except ImageTooLarge as e:
+            print(f"Rejected image: {str(e)}")
+            return jsonify({"error": "Image too large"}), 413
+        except ImageDecodeError:
             print("Failed to decode image")
             return jsonify({"error": "Failed to decode image"}), 400
 
-        # Run YOLOv8 object detection on the image
-        results = model(img)
-
-        # Find the object with highest confidence
-        highest_confidence_object = None
-        highest_confidence = 0
-
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Get confidence score
-                confidence = float(box.conf[0])
-                
-                # Check if this object has higher confidence than the current highest
-                if confidence > highest_confidence:
-                    # Get bounding box coordinates and convert them to native Python floats
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    x1 = float(x1)
-                    y1 = float(y1)
-                    x2 = float(x2)
-                    y2 = float(y2)
-
-                    # Get label
-                    label_index = int(box.cls[0])
-                    label = model.names[label_index]
-                    
-                    # Update highest confidence object
-                    highest_confidence = confidence
-                    highest_confidence_object = {
-                        "label": label,
-                        "box": [x1, y1, x2, y2],
-                        "confidence": confidence
-                    }
-
-        # Return the highest confidence object or an empty array if nothing was detected
-        if highest_confidence_object:
-            return jsonify([highest_confidence_object])
-        else:
-            return jsonify([])
+        response = jsonify(detections)
+        response.headers["X-Cache"] = cache_status
+        return response
 
+    except ModelNotReady:
+        return jsonify({"error": "Model is loading"}), 503
     except Exception as e:
         print(f"Error processing image: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
+
+
+@process_bp.route('/process-image-batch', methods=['POST'])
+def process_image_batch():
+    try:
+        files = request.files.getlist('images')
+        if not files:
+            print("No images found in request.files")
+            return jsonify({"error": "No images provided"}), 400
+        if len(files) > DETECTION_MAX_BATCH_IMAGES:
+            return jsonify({"error": f"At most {DETECTION_MAX_BATCH_IMAGES} images per batch"}), 400
+
+        print(f"Batch of {len(files)} images received")
+
+        try:
+            options = detection_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid detection options: {str(e)}"}), 400
+
+        # Decode everything up front so undecodable files don't break the batch
+        responses = []
+        images = []
+        for file in files:
+            data = file.read()
+            try:
+                detections, cache_key, phash = _cache_lookup(data, options)
+                if detections is not None:
+                    responses.append({"filename": file.filename, "detections": detections, "cached": True})
+                    continue
+                img, transform = _decode_image(data)
+            except ImageTooLarge as e:
+                print(f"Rejected image {file.filename}: {str(e)}")
+                responses.append({"filename": file.filename, "error": "Image too large"})
+                continue
+
+            if img is None:
+                print(f"Failed to decode image {file.filename}")
+                responses.append({"filename": file.filename, "error": "Failed to decode image"})
+            else:
+                responses.append({"filename": file.filename, "detections": [], "cached": False})
+                images.append((len(responses) - 1, img, transform, cache_key, phash))
+
+        # Run every decoded image through the model in as few passes as possible
+        if images:
+            results = _run_model_batch([img for _, img, _, _, _ in images])
+            for (index, _, transform, cache_key, phash), result in zip(images, results):
+                responses[index]["detections"] = select_detections(result, transform, **options)
+                _cache_store(cache_key, phash, options, responses[index]["detections"])
+
+        return jsonify({"results": responses})
+
+    except ModelNotReady:
+        return jsonify({"error": "Model is loading"}), 503
+    except Exception as e:
+        print(f"Error processing image batch: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@process_bp.route('/inference-pool/stats', methods=['GET'])
+def inference_pool_stats():
+    pool = registry.model
+    if not isinstance(pool, InferencePool):
+        return jsonify({"enabled": DETECTION_WORKERS > 0}), 200
+    return jsonify({"enabled": True, **pool.stats()}), 200
+
+
+@process_bp.route('/detection-cache/stats', methods=['GET'])
+def detection_cache_stats():
+    if not detection_cache:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, "mode": DETECTION_CACHE_MODE, **detection_cache.stats()}), 200
+
+
+@process_bp.route('/ready', methods=['GET'])
+def ready():
+    status = registry.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@process_bp.route('/admin/model', methods=['GET', 'POST'])
+def admin_model():
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+
+    if request.method == 'GET':
+        return jsonify(registry.status()), 200
+
+    data = request.get_json(silent=True) or {}
+    weights = data.get('weights')
+    if not weights:
+        return jsonify({"error": "weights is required"}), 400
+
+    if not registry.load_async(weights):
+        return jsonify({"error": "Another model is already loading", **registry.status()}), 409
+
+    return jsonify({"message": f"Loading {weights}", **registry.status()}), 202
+
+
+@process_bp.route('/stream/sessions', methods=['POST'])
+def create_stream_session():
+    # Options may come as form fields or JSON, with the same names as /process-image
+    form = request.form if request.form else {key: str(value) for key, value in (request.get_json(silent=True) or {}).items()}
+    try:
+        options = detection_options(form)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid detection options: {str(e)}"}), 400
+
+    session = stream_sessions.create(options, STREAM_KEYFRAME_INTERVAL, STREAM_SCENE_CHANGE_THRESHOLD)
+    if not session:
+        return jsonify({"error": "Too many active stream sessions"}), 503
+
+    return jsonify({"session_id": session.session_id, "ttl_seconds": STREAM_SESSION_TTL}), 201
+
+
+@process_bp.route('/stream/sessions/<session_id>/frames', methods=['POST'])
+def process_stream_frame(session_id):
+    try:
+        session = stream_sessions.get(session_id)
+        if not session:
+            return jsonify({"error": "Unknown or expired session"}), 404
+
+        if 'frame' not in request.files:
+            return jsonify({"error": "No frame provided"}), 400
+
+        try:
+            seq = int(request.form.get('seq', session.latest_seq + 1))
+        except ValueError:
+            return jsonify({"error": "seq must be an integer"}), 400
+
+        # Frames older than one already received are dropped instead of queueing up behind it
+        if not session.mark_arrival(seq):
+            session.stats["dropped"] += 1
+            return jsonify({"session_id": session_id, "seq": seq, "dropped": True}), 200
+
+        try:
+            img, transform = _decode_image(request.files['frame'].read())
+        except ImageTooLarge as e:
+            print(f"Rejected stream frame: {str(e)}")
+            return jsonify({"error": "Image too large"}), 413
+
+        if img is None:
+            return jsonify({"error": "Failed to decode image"}), 400
+
+        gray, ratio = tracking_frame(img)
+
+        with session.lock:
+            # A newer frame arrived while this one was waiting for the session
+            if session.is_stale(seq):
+                session.stats["dropped"] += 1
+                return jsonify({"session_id": session_id, "seq": seq, "dropped": True}), 200
+
+            keyframe = session.needs_keyframe(gray, transform)
+            if keyframe:
+                detections = select_detections(_detect(img), transform, **session.options)
+                session.update_keyframe(gray, ratio, transform, detections)
+            else:
+                detections = session.track(gray, ratio, transform)
+
+            session.processed_seq = seq
+            session.stats["frames"] += 1
+
+        return jsonify({
+            "session_id": session_id,
+            "seq": seq,
+            "dropped": False,
+            "keyframe": keyframe,
+            "detections": detections,
+        }), 200
+
+    except ModelNotReady:
+        return jsonify({"error": "Model is loading"}), 503
+    except Exception as e:
+        print(f"Error processing stream frame: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@process_bp.route('/stream/sessions/<session_id>', methods=['GET', 'DELETE'])
+def stream_session(session_id):
+    if request.method == 'DELETE':
+        session = stream_sessions.close(session_id)
+    else:
+        session = stream_sessions.get(session_id)
+
+    if not session:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    return jsonify({"session_id": session_id, **session.stats}), 200
@@ -0,0 +1,109 @@
+import re
+
+from .chp_scraper import ITEMS_HEBREW
+
+# Other English names, and labels used by common produce detection datasets, for each product
+SYNONYMS = {
+    "Apple": ["green apple", "red apple", "granny smith"],
+    "Broccoli": ["broccolli"],
+    "Cabbage": ["red cabbage", "white cabbage"],
+    "Cucumber": ["cuke"],
+    "Kiwi": ["kiwifruit", "kiwi fruit"],
+    "Lettuce": ["romaine", "iceberg lettuce"],
+    "Melon": ["cantaloupe", "honeydew"],
+    "Mushroom": ["champignon"],
+    "Onion": ["red onion", "white onion", "yellow onion"],
+    "Pepper": ["bell pepper", "sweet pepper", "capsicum"],
+    "Pineapple": ["ananas"],
+    "Potato": ["potatos", "spud"],
+    "Spinach": ["baby spinach"],
+    "Tomato": ["cherry tomato", "tomatos"],
+}
+
+# Hebrew forms other than the ones in ITEMS_HEBREW, mostly plurals
+HEBREW_ALIASES = {
+    "Apple": ["תפוחים"],
+    "Banana": ["בננות"],
+    "Carrot": ["גזרים"],
+    "Tomato": ["עגבניות"],
+    "Potato": ["תפוחי אדמה"],
+    "Orange": ["תפוזים"],
+    "Grape": ["ענבים"],
+    "Onion": ["בצלים"],
+    "Cucumber": ["מלפפונים"],
+    "Pepper": ["פלפלים"],
+    "Mushroom": ["פטריה", "פטרייה"],
+    "Strawberry": ["תות", "תותים"],
+    "Peach": ["אפרסקים"],
+    "Plum": ["שזיפים"],
+    "Pear": ["אגסים"],
+    "Lemon": ["לימונים"],
+    "Olive": ["זיתים"],
+}
+
+
+def _key(name: str) -> str:
+    return " ".join(re.sub(r"[_\-]+", " ", name).split()).lower()
+
+
+def _plurals(name: str):
+    """English plural spellings a client might send for name."""
+    forms = {name + "s", name + "es"}
+    if name.endswith("y") and name[-2:-1] not in "aeiou":
+        forms.add(name[:-1] + "ies")
+    return forms
+
+
+def _singulars(name: str):
+    """Candidate singular forms of a possibly plural name, most specific first."""
+    candidates = []
+    if name.endswith("ies"):
+        candidates.append(name[:-3] + "y")
+    if name.endswith("es"):
+        candidates.append(name[:-2])
+    if name.endswith("s"):
+        candidates.append(name[:-1])
+    return candidates
+
+
+def _build_index() -> dict:
+    index = {}
+
+    def add(alias, product):
+        index.setdefault(_key(alias), product)
+
+    for product, hebrew in ITEMS_HEBREW.items():
+        add(product, product)
+        add(hebrew, product)
+    for product, aliases in SYNONYMS.items():
+        for alias in aliases:
+            add(alias, product)
+    for product, aliases in HEBREW_ALIASES.items():
+        for alias in aliases:
+            add(alias, product)
+
+    # Plurals of everything English that is already in the index
+    for alias, product in list(index.items()):
+        if alias.isascii():
+            for plural in _plurals(alias):
+                add(plural, product)
+    return index
+
+
+# Built once at import; maps every known spelling to its ITEMS_HEBREW key
+PRODUCT_INDEX = _build_index()
+
+
+def resolve_product(name) -> str:
+    """Return the ITEMS_HEBREW key for a product name, label or alias, or None if it is unknown."""
+    if not isinstance(name, str):
+        return None
+    key = _key(name)
+    product = PRODUCT_INDEX.get(key)
+    if product:
+        return product
+    for candidate in _singulars(key):
+        product = PRODUCT_INDEX.get(candidate)
+        if product:
+            return product
+    return None
@@ -1,7 +1,8 @@
 # routes/profile.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from pymongo.errors import DuplicateKeyError
 from extensions import bcrypt, mongo  # Import shared instances from extensions.py
 from bson import ObjectId  # For handling MongoDB ObjectIds
 
@@ -71,7 +72,14 @@ def update_profile():
 
     # Perform the update if there are valid fields to update
     if update_fields:
-        users.update_one({'_id': ObjectId(user_id)}, {'$set': update_fields})
+        # As in /register, look for a taken username only while the unique index is not confirmed
+        if ('username' in update_fields and not current_app.config.get('USERNAME_INDEX_ENFORCED', False)
+                and users.find_one({'username': update_fields['username'], '_id': {'$ne': ObjectId(user_id)}})):
+            return jsonify({'message': 'Username already exists'}), 409
+        try:
+            users.update_one({'_id': ObjectId(user_id)}, {'$set': update_fields})
+        except DuplicateKeyError:
+            return jsonify({'message': 'Username already exists'}), 409
         return jsonify({'message': 'Profile updated successfully'}), 200
     else:
         return jsonify({'message': 'No valid fields to update'}), 400
\ No newline at end of file
@@ -1,5 +1,6 @@
 # auth/register.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
+from pymongo.errors import DuplicateKeyError
 from extensions import bcrypt, mongo  # Import the initialized instances from extensions.py
 
 # Define a blueprint for the register route
@@ -12,11 +13,16 @@ def register():
     password = request.json.get('password')
     email = request.json.get('email')
 
-
-    if users.find_one({'username': username}):
+    # Without a confirmed unique index nothing else stops a duplicate, so look first;
+    # concurrent registrations can still race past this check until the index exists
+    if not current_app.config.get('USERNAME_INDEX_ENFORCED', False) and users.find_one({'username': username}):
         return jsonify({'message': 'User already exists'}), 409
 
     hashed_pw = bcrypt.generate_password_hash(password).decode('utf-8')
-    users.insert_one({'username': username, 'password': hashed_pw,'email':email})
+    # The unique username index rejects duplicates, including concurrent registrations
+    try:
+        users.insert_one({'username': username, 'password': hashed_pw,'email':email})
+    except DuplicateKeyError:
+        return jsonify({'message': 'User already exists'}), 409
 
     return jsonify({'message': 'User registered successfully'}), 201
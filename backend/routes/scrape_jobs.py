@@ -0,0 +1,184 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def run(self, key, fn):
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {**self.stats, "inflight": len(self._inflight)}
+
+
+class ScrapeJob:
+    """Progress and results of one submitted (location, items) search."""
+
+    def __init__(self, location: str, items, options: dict):
+        self.id = uuid.uuid4().hex
+        self.location = location
+        self.items = list(items)
+        self.options = options
+        self.results = [None] * len(self.items)
+        # time.monotonic() at which each item started running, None while it is queued
+        self.item_started_at = [None] * len(self.items)
+        # Item indexes in the order they finished, so watchers can pick up only what is new
+        self.completed = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._condition = threading.Condition()
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return "done"
+        return "running" if self.started_at is not None else "queued"
+
+    def _start(self, index: int):
+        with self._condition:
+            self.item_started_at[index] = time.monotonic()
+            if self.started_at is None:
+                self.started_at = time.time()
+
+    def _complete(self, index: int, result: dict):
+        with self._condition:
+            self.results[index] = result
+            self.completed.append(index)
+            if len(self.completed) == len(self.items):
+                self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def wait(self, seen: int = 0, timeout: float = None) -> list:
+        """
+        Block until more than seen items have finished or the job is done.
+
+        Returns the indexes of the items that finished after the first seen.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: len(self.completed) > seen or self.finished_at is not None, timeout
+            )
+            return self.completed[seen:]
+
+    def to_dict(self) -> dict:
+        with self._condition:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "location": self.location,
+                "items": self.items,
+                "completed": len(self.completed),
+                "total": len(self.items),
+                "results": list(self.results),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class ScrapeJobQueue:
+    """
+    In-memory queue of scrape jobs executed on a shared worker pool.
+
+    Each item of a job is submitted to executor separately and runs
+    search_fn(location, item, **options). Finished jobs are kept for
+    ttl_seconds so clients can collect their results, and at most
+    max_jobs are retained.
+    """
+
+    def __init__(self, search_fn, executor, ttl_seconds: float = 600, max_jobs: int = 1000):
+        self.search_fn = search_fn
+        self.executor = executor
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "expired": 0}
+
+    def submit(self, location: str, items, **options) -> ScrapeJob:
+        job = ScrapeJob(location, items, options)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+
+        if not job.items:
+            job.finished_at = time.time()
+        for index, item in enumerate(job.items):
+            self.executor.submit(self._run_item, job, index, item)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run_item(self, job: ScrapeJob, index: int, item: str):
+        job._start(index)
+        try:
+            result = self.search_fn(job.location, item, **job.options)
+        except Exception as e:
+            print(f"Error in scrape job {job.id} for {item}: {str(e)}")
+            result = {"status": "error", "message": str(e), "product": item, "error_type": "general"}
+        job._complete(index, result)
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        # Beyond max_jobs, drop the oldest finished jobs first
+        finished = sorted((job for job in self._jobs.values() if job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        overflow = len(self._jobs) - len(expired) - self.max_jobs + 1
+        for job in finished:
+            if overflow <= 0:
+                break
+            if job.id not in expired:
+                expired.append(job.id)
+                overflow -= 1
+        for job_id in expired:
+            del self._jobs[job_id]
+        self.stats["expired"] += len(expired)
+
+    def status(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            counts = {"queued": 0, "running": 0, "done": 0}
+            for job in jobs:
+                counts[job.status] += 1
+            return {**self.stats, **counts}
@@ -1,22 +1,398 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_cors import CORS
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+import atexit
+import json
+import math
 import os
-from .chp_scraper import CHPScraper
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from extensions import metrics, mongo
+from .chp_scraper import CHPScraper, ITEMS_HEBREW, RESULTS_TOP_N, address_cache, rank_results
+from .scraper_pool import ScraperPool, PoolExhausted
+from .price_cache import PriceCache, cache_key
+from .scrape_jobs import ScrapeJobQueue, SingleFlight
+from .cache_warmer import CacheWarmer
+from .store_catalogue import StoreCatalogue
+from .product_names import resolve_product
+from .price_history import PriceHistory
+from .chp_http_scraper import CHPHttpScraper
 
 # Define the blueprint
 scraper_bp = Blueprint('scraper_bp', __name__)
 CORS(scraper_bp)  # Enable CORS for all routes in this blueprint
 
-# Path to ChromeDriver from .env
-CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH")
+# Shared pool of warm Chrome sessions used by every scraping route
+SCRAPER_POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE", "2"))
+SCRAPER_MAX_USES = int(os.getenv("SCRAPER_MAX_USES", "50"))
+SCRAPER_IDLE_TIMEOUT = float(os.getenv("SCRAPER_IDLE_TIMEOUT", "300"))
+SCRAPER_ACQUIRE_TIMEOUT = float(os.getenv("SCRAPER_ACQUIRE_TIMEOUT", "60"))
+SCRAPER_POOL_PREWARM = int(os.getenv("SCRAPER_POOL_PREWARM", "0"))
+
+scraper_pool = ScraperPool(
+    CHPScraper,
+    size=SCRAPER_POOL_SIZE,
+    max_uses=SCRAPER_MAX_USES,
+    idle_timeout=SCRAPER_IDLE_TIMEOUT,
+    acquire_timeout=SCRAPER_ACQUIRE_TIMEOUT,
+)
+atexit.register(scraper_pool.shutdown)
+metrics.register_gauge("fruitlens_scraper_pool", "Scraper pool sessions and lifecycle counters", scraper_pool.status)
+if SCRAPER_POOL_PREWARM:
+    scraper_pool.prewarm(SCRAPER_POOL_PREWARM)
+
+# "http" searches through the browserless client first and only falls back to Chrome on
+# failure; "selenium" always uses Chrome
+SCRAPER_BACKEND = os.getenv("SCRAPER_BACKEND", "selenium")
+http_scraper = CHPHttpScraper() if SCRAPER_BACKEND == "http" else None
+
+# Items of one /api/scrape request are searched in parallel on up to SCRAPER_CONCURRENCY
+# pooled sessions; SCRAPER_ITEM_TIMEOUT covers waiting for a session plus the search itself
+SCRAPER_CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", str(SCRAPER_POOL_SIZE)))
+SCRAPER_ITEM_TIMEOUT = float(os.getenv("SCRAPER_ITEM_TIMEOUT", "90"))
+
+# Upper bound on the top_n a client may ask for
+RESULTS_MAX_TOP_N = int(os.getenv("RESULTS_MAX_TOP_N", "50"))
+# Most items accepted in one scrape request
+SCRAPER_MAX_ITEMS = int(os.getenv("SCRAPER_MAX_ITEMS", "50"))
+
+# Shared across requests so a timed-out search never holds up the response that gave up on it
+item_executor = ThreadPoolExecutor(max_workers=max(1, SCRAPER_CONCURRENCY), thread_name_prefix="scrape-item")
+
+# Location warm-ups for /detect-and-price run apart from search items, since one can hold
+# a thread for as long as it waits to acquire a pooled session
+SCRAPER_PREPARE_WORKERS = int(os.getenv("SCRAPER_PREPARE_WORKERS", "2"))
+prepare_executor = ThreadPoolExecutor(max_workers=max(1, SCRAPER_PREPARE_WORKERS), thread_name_prefix="scraper-prepare")
+
+# Scraped prices are served from Mongo for PRICE_CACHE_FRESH_SECONDS, then served stale
+# while being refreshed in the background until PRICE_CACHE_MAX_AGE_SECONDS
+PRICE_CACHE_ENABLED = os.getenv("PRICE_CACHE", "true").lower() == "true"
+PRICE_CACHE_FRESH_SECONDS = float(os.getenv("PRICE_CACHE_FRESH_SECONDS", str(6 * 3600)))
+PRICE_CACHE_MAX_AGE_SECONDS = float(os.getenv("PRICE_CACHE_MAX_AGE_SECONDS", str(24 * 3600)))
+# Background refreshes run on their own threads so they never queue ahead of /api/scrape
+# items; at most PRICE_CACHE_REFRESH_QUEUE of them are queued or running at once
+PRICE_CACHE_REFRESH_WORKERS = int(os.getenv("PRICE_CACHE_REFRESH_WORKERS", "1"))
+PRICE_CACHE_REFRESH_QUEUE = int(os.getenv("PRICE_CACHE_REFRESH_QUEUE", "8"))
+
+refresh_executor = ThreadPoolExecutor(max_workers=max(1, PRICE_CACHE_REFRESH_WORKERS),
+                                      thread_name_prefix="price-refresh")
+
+price_cache = PriceCache(
+    lambda: mongo.db.price_cache,
+    PRICE_CACHE_FRESH_SECONDS,
+    PRICE_CACHE_MAX_AGE_SECONDS,
+    refresh_executor=refresh_executor,
+    max_refreshes=PRICE_CACHE_REFRESH_QUEUE,
+) if PRICE_CACHE_ENABLED else None
+if price_cache:
+    metrics.register_gauge("fruitlens_price_cache", "Price cache hits, stale hits, misses and refreshes", price_cache.status)
+
+
+# Concurrent lookups of the same (location, product) share one scrape
+inflight_scrapes = SingleFlight()
+metrics.register_gauge("fruitlens_scrape_coalescing", "Scrape calls and how many joined one already in flight",
+                       inflight_scrapes.status)
+
+
+def _scrape_item(location, product_name):
+    """
+    Search one product over HTTP when enabled, otherwise (or on failure) on a pooled browser session.
+
+    The full parsed table is always kept so cached results can be re-ranked for any top_n.
+    """
+    if http_scraper:
+        result = http_scraper.search_product(location, product_name, include_all=True)
+        if result["status"] == "success" or result.get("error_type") != "http":
+            return result
+        print(f"Falling back to Selenium for {product_name}")
+
+    with scraper_pool.session(location=location) as scraper:
+        return scraper.search_product(location, product_name, include_all=True)
+
+
+# Every scraped results table is added to the store catalogue behind /find-stores
+store_catalogue = StoreCatalogue(lambda: mongo.db.stores)
+
+# ...and to the price history, written in batches of PRICE_HISTORY_BATCH_SIZE rows
+PRICE_HISTORY_ENABLED = os.getenv("PRICE_HISTORY", "true").lower() == "true"
+PRICE_HISTORY_BATCH_SIZE = int(os.getenv("PRICE_HISTORY_BATCH_SIZE", "500"))
+PRICE_ROLLUP_INTERVAL = float(os.getenv("PRICE_ROLLUP_INTERVAL", "900"))
+PRICE_HISTORY_MAX_DAYS = int(os.getenv("PRICE_HISTORY_MAX_DAYS", "365"))
+
+price_history = PriceHistory(
+    lambda: mongo.db,
+    batch_size=PRICE_HISTORY_BATCH_SIZE,
+    rollup_interval=PRICE_ROLLUP_INTERVAL,
+) if PRICE_HISTORY_ENABLED else None
+if price_history:
+    price_history.start()
+    atexit.register(price_history.flush)
+    metrics.register_gauge("fruitlens_price_history", "Price history rows recorded and written, and rollups",
+                           price_history.status)
+
+
+def _scrape_and_record(location, product_name):
+    result = _scrape_item(location, product_name)
+    rows = (result.get("results") or {}).get("all") if result.get("status") == "success" else None
+    if rows:
+        try:
+            store_catalogue.harvest(location, product_name, rows)
+        except Exception as e:
+            print(f"Error updating store catalogue: {str(e)}")
+        if price_history:
+            price_history.record(location, product_name, rows)
+    return result
+
+
+def _fetch_item(location, product_name):
+    """Scrape one product, sharing the scrape with any identical lookup already in flight."""
+    return inflight_scrapes.run(cache_key(location, product_name), lambda: _scrape_and_record(location, product_name))
+
+
+# Off-peak warming of the most requested (location, product) pairs; needs the price cache
+CACHE_WARMER_ENABLED = os.getenv("CACHE_WARMER", "false").lower() == "true"
+CACHE_WARMER_BUDGET = int(os.getenv("CACHE_WARMER_BUDGET", "50"))
+CACHE_WARMER_CONCURRENCY = int(os.getenv("CACHE_WARMER_CONCURRENCY", str(SCRAPER_POOL_SIZE)))
+# Local hours "start-end" during which the daily run may start
+CACHE_WARMER_WINDOW = tuple(int(hour) for hour in os.getenv("CACHE_WARMER_WINDOW", "2-5").split("-"))
+CACHE_WARMER_MIN_AGE_SECONDS = float(os.getenv("CACHE_WARMER_MIN_AGE_SECONDS", str(PRICE_CACHE_FRESH_SECONDS / 2)))
+CACHE_WARMER_LOOKBACK_DAYS = int(os.getenv("CACHE_WARMER_LOOKBACK_DAYS", "7"))
+CACHE_WARMER_DRY_RUN = os.getenv("CACHE_WARMER_DRY_RUN", "false").lower() == "true"
+
+# Token required in the X-Admin-Token header for warming runs and store imports
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+cache_warmer = CacheWarmer(
+    lambda: mongo.db.scrape_demand,
+    lambda: mongo.db.cache_warming_runs,
+    warm_fn=lambda location, product_name, run_id: price_cache.warm(
+        location, product_name, lambda: _fetch_item(location, product_name), run_id=run_id
+    ),
+    age_fn=lambda location, product_name: price_cache.age(location, product_name),
+    budget=CACHE_WARMER_BUDGET,
+    concurrency=CACHE_WARMER_CONCURRENCY,
+    window=CACHE_WARMER_WINDOW,
+    min_age_seconds=CACHE_WARMER_MIN_AGE_SECONDS,
+    lookback_days=CACHE_WARMER_LOOKBACK_DAYS,
+    dry_run=CACHE_WARMER_DRY_RUN,
+    # Warmed-entry hits are written to the cache and credited to their run with each demand flush
+    served_fn=lambda: price_cache.flush_served(),
+) if price_cache else None
+if cache_warmer:
+    # Demand is flushed to Mongo either way; the daily run is only scheduled with CACHE_WARMER=true
+    cache_warmer.start(schedule=CACHE_WARMER_ENABLED)
+
+
+def _select_results(result, top_n, include_all):
+    """Re-rank a full-table result for the requested top_n, dropping the table unless asked for."""
+    stores = result.get("results")
+    if result.get("status") != "success" or not stores or "all" not in stores:
+        return result
+    return {**result, "results": rank_results(stores["all"], top_n, include_all)}
+
+
+def _search_item(location, product_name, top_n=RESULTS_TOP_N, include_all=False):
+    """Look up one product through the price cache, turning failures into an error result."""
+    # Unknown products are answered here, before the cache or a browser session is touched
+    if product_name not in ITEMS_HEBREW:
+        return {
+            "status": "error",
+            "message": f"No Hebrew translation found for {product_name}",
+            "product": product_name,
+            "error_type": "unknown_product"
+        }
+
+    try:
+        if cache_warmer:
+            cache_warmer.record(location, product_name)
+        if price_cache:
+            result = price_cache.get(location, product_name, lambda: _fetch_item(location, product_name))
+        else:
+            result = _fetch_item(location, product_name)
+        return _select_results(result, top_n, include_all)
+    except Exception as e:
+        print(f"Error searching {product_name}: {str(e)}")
+        return {
+            "status": "error",
+            "message": str(e),
+            "product": product_name,
+            "error_type": "unavailable" if isinstance(e, PoolExhausted) else "general"
+        }
+
+
+def finish_within_deadlines(count, started_at, wait_finished, timeout, workers):
+    """
+    Yield (index, timed_out) for each of count items as it finishes or runs out of time.
+
+    Each item gets timeout seconds from the moment it starts running, as
+    reported by started_at(index) (None while queued). Items still queued
+    once every one of workers could have run its share are given up on.
+    wait_finished(pending, seconds) blocks for up to seconds and returns the
+    indexes that have finished; every index is yielded exactly once.
+    """
+    rounds = math.ceil(count / max(1, workers))
+    queue_deadline = time.monotonic() + timeout * max(1, rounds)
+    pending = set(range(count))
+    wait_for = 0
+    while pending:
+        # Finished items are taken first, so one that completed in time is never reported as timed out
+        for index in wait_finished(pending, wait_for):
+            if index in pending:
+                pending.discard(index)
+                yield index, False
+
+        now = time.monotonic()
+        for index in sorted(pending):
+            started = started_at(index)
+            if (started is not None and now - started >= timeout) or (started is None and now >= queue_deadline):
+                pending.discard(index)
+                yield index, True
+
+        if pending:
+            deadlines = [started_at(index) + timeout for index in pending if started_at(index) is not None]
+            wait_for = max(0.01, min(deadlines + [queue_deadline, now + 0.5]) - now)
+
+
+def _timed_out(name, timeout):
+    print(f"Search for {name} timed out after {timeout}s")
+    return {
+        "status": "error",
+        "message": f"Timed out after {timeout}s",
+        "product": name,
+        "error_type": "timeout"
+    }
+
+
+def search_items(location, product_names, timeout: float = None, top_n: int = RESULTS_TOP_N,
+                 include_all: bool = False):
+    """
+    Search several products concurrently and return their results in input order.
+
+    Items are timed as in finish_within_deadlines; one that takes too long
+    gets an error result without delaying the others, and one that never
+    started is cancelled.
+    """
+    timeout = SCRAPER_ITEM_TIMEOUT if timeout is None else timeout
+    started_at = [None] * len(product_names)
+
+    def run(index, name):
+        started_at[index] = time.monotonic()
+        return _search_item(location, name, top_n, include_all)
+
+    def wait_finished(pending, seconds):
+        wait([futures[index] for index in pending], timeout=seconds, return_when=FIRST_COMPLETED)
+        return [index for index in pending if futures[index].done()]
+
+    futures = [item_executor.submit(run, index, name) for index, name in enumerate(product_names)]
+    results = [None] * len(product_names)
+    for index, timed_out in finish_within_deadlines(len(product_names), started_at.__getitem__, wait_finished,
+                                                    timeout, SCRAPER_CONCURRENCY):
+        if timed_out:
+            # Drops the item if it hasn't started; a running scrape finishes and only fills the cache
+            futures[index].cancel()
+            results[index] = _timed_out(product_names[index], timeout)
+        else:
+            results[index] = futures[index].result()
+    return results
+
+
+# Submitted scrape jobs run on their own workers so the request that created them returns at once
+SCRAPE_JOB_WORKERS = int(os.getenv("SCRAPE_JOB_WORKERS", str(SCRAPER_CONCURRENCY)))
+SCRAPE_JOB_TTL = float(os.getenv("SCRAPE_JOB_TTL", "600"))
+SCRAPE_JOB_MAX_WAIT = float(os.getenv("SCRAPE_JOB_MAX_WAIT", "30"))
+
+job_executor = ThreadPoolExecutor(max_workers=max(1, SCRAPE_JOB_WORKERS), thread_name_prefix="scrape-job")
+scrape_jobs = ScrapeJobQueue(_search_item, job_executor, ttl_seconds=SCRAPE_JOB_TTL)
+metrics.register_gauge("fruitlens_scrape_jobs", "Scrape jobs by state", scrape_jobs.status)
+
+
+def _parse_scrape_request(data):
+    """
+    Validate an /api/scrape style body.
+
+    Returns (location, items, options, None) or (None, None, None, error_response).
+    """
+    if not data:
+        return None, None, None, (jsonify({
+            'status': 'error',
+            'message': 'No JSON data received'
+        }), 400)
+
+    if 'location' not in data or 'items' not in data:
+        return None, None, None, (jsonify({
+            'status': 'error',
+            'message': 'Missing required fields: location and items'
+        }), 400)
+
+    location = data['location']
+    if not isinstance(location, str) or not location.strip():
+        return None, None, None, (jsonify({
+            'status': 'error',
+            'message': 'Location must be a non-empty string'
+        }), 400)
+
+    items = data['items']
+    if not isinstance(items, list):
+        return None, None, None, (jsonify({
+            'status': 'error',
+            'message': 'Items must be a list'
+        }), 400)
+    if len(items) > SCRAPER_MAX_ITEMS:
+        return None, None, None, (jsonify({
+            'status': 'error',
+            'message': f'At most {SCRAPER_MAX_ITEMS} items per request'
+        }), 400)
+
+    top_n = data.get('top_n', RESULTS_TOP_N)
+    if isinstance(top_n, bool) or not isinstance(top_n, int) or not 1 <= top_n <= RESULTS_MAX_TOP_N:
+        return None, None, None, (jsonify({
+            'status': 'error',
+            'message': f'top_n must be an integer between 1 and {RESULTS_MAX_TOP_N}'
+        }), 400)
+
+    # Resolve plurals, synonyms, detector labels and Hebrew names; unknown items pass through as-is
+    processed_items = [resolve_product(item) or str(item) for item in items]
+    options = {'top_n': top_n, 'include_all': bool(data.get('include_all', False))}
+    return location, processed_items, options, None
+
+
+def needs_scrape(location, product_name) -> bool:
+    """
+    Whether looking up product_name in location would scrape on the request path.
+
+    Unknown products are answered without a scrape, and cached entries, even
+    stale ones, are served while any refresh runs in the background.
+    """
+    if product_name not in ITEMS_HEBREW:
+        return False
+    if not price_cache:
+        return True
+    try:
+        age = price_cache.age(location, product_name)
+    except Exception as e:
+        print(f"Error reading price cache: {str(e)}")
+        return True
+    return age is None or age >= price_cache.max_age_seconds
+
+
+def prepare_location(location):
+    """
+    Get a session ready for searches in location ahead of the items being known.
+
+    Resolves the address over HTTP with the browserless backend; otherwise
+    enters it on a pooled browser, which later searches for location prefer.
+    """
+    try:
+        if http_scraper:
+            http_scraper.resolve_address(location)
+            return
+        if scraper_pool.has_location(location):
+            return
+        with scraper_pool.session(location=location) as scraper:
+            scraper.enter_location(location)
+    except Exception as e:
+        print(f"Error preparing scraper for {location}: {str(e)}")
 
-# Configure Chrome options
-chrome_options = Options()
-chrome_options.add_argument("--headless")  # Run in headless mode
-chrome_options.add_argument("--disable-gpu")
 
 # Scrape a single URL (existing functionality)
 @scraper_bp.route('/scrape', methods=['POST'])
@@ -25,92 +401,306 @@ def scrape():
     if not url:
         return jsonify({'error': 'URL is required'}), 400
 
-    service = Service(CHROMEDRIVER_PATH)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-
     try:
-        driver.get(url)
-        title = driver.title
+        with scraper_pool.session() as scraper:
+            # Whatever page this leaves behind, the entered location is no longer on it
+            scraper.current_location = None
+            scraper.driver.get(url)
+            title = scraper.driver.title
         return jsonify({'title': title}), 200
+    except PoolExhausted as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        driver.quit()
 
 # Find closest stores for a batch of items
 @scraper_bp.route('/find-stores', methods=['POST'])
 def find_stores():
-    items = request.json.get('items')
+    """
+    Closest store carrying each item, answered from the store catalogue.
+
+    Distances come from lat/lon when given, otherwise from earlier searches
+    of location; with neither, the cheapest known store is returned.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
     if not items or not isinstance(items, list):
         return jsonify({'error': 'Items must be a list'}), 400
 
-    service = Service(CHROMEDRIVER_PATH)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    try:
+        lat = float(data['lat']) if data.get('lat') is not None else None
+        lon = float(data['lon']) if data.get('lon') is not None else None
+        limit = int(data.get('limit', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'lat, lon and limit must be numbers'}), 400
 
     try:
         results = []
         for item in items:
-            driver.get(f"https://www.google.com/search?q={item}+store+near+me")
-            # Example logic: Find the first result title (adjust the XPath or logic based on Google's structure)
-            closest_store = driver.find_element("xpath", "//h3").text
-            results.append({'item': item, 'closest_store': closest_store})
+            product_name = resolve_product(item) or str(item)
+            stores = store_catalogue.nearest(data.get('location'), lat, lon, product_name, limit=max(1, limit))
+            closest = stores[0] if stores else None
+            results.append({
+                'item': item,
+                'closest_store': f"{closest['store_chain']} - {closest['store_name']}" if closest else None,
+                'stores': stores
+            })
 
         return jsonify({'results': results}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        driver.quit()
+
+
+@scraper_bp.route('/api/stores', methods=['GET', 'POST'])
+def stores_catalogue():
+    """GET reports catalogue size; POST bulk-imports a list of stores (admin token)."""
+    if request.method == 'GET':
+        try:
+            return jsonify(store_catalogue.status()), 200
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Forbidden'}), 403
+
+    stores = (request.get_json(silent=True) or {}).get('stores')
+    if not isinstance(stores, list):
+        return jsonify({'error': 'stores must be a list'}), 400
+    try:
+        imported = store_catalogue.bulk_import(stores)
+    except KeyError as e:
+        return jsonify({'error': f'Missing store field: {e.args[0]}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'imported': imported}), 200
 
 @scraper_bp.route('/api/scrape', methods=['POST'])
 def scrape_prices():
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'status': 'error',
-                'message': 'No JSON data received'
-            }), 400
-            
-        if 'location' not in data or 'items' not in data:
-            return jsonify({
-                'status': 'error',
-                'message': 'Missing required fields: location and items'
-            }), 400
-            
-        location = data['location']
-        items = data['items']
-        
-        if not isinstance(items, list):
-            return jsonify({
-                'status': 'error',
-                'message': 'Items must be a list'
-            }), 400
-        
-        # Initialize scraper once for all items
-        scraper = CHPScraper()
-        all_results = []
-        
-        try:
-            # Process each item
-            for item in items:
-                # Remove trailing 's' if exists and capitalize
-                processed_item = item.rstrip('s').capitalize()
-                result = scraper.search_product(location, processed_item)
-                all_results.append(result)
+        location, processed_items, options, error = _parse_scrape_request(request.get_json())
+        if error:
+            return error
+
+        # Search all items in parallel on pooled sessions
+        all_results = search_items(location, processed_items, **options)
                 
-            return jsonify({
-                'status': 'success',
-                'message': 'All items processed',
-                'results': all_results
-            })
-            
-        finally:
-            scraper.cleanup()  # Ensure we clean up the scraper
+        return jsonify({
+            'status': 'success',
+            'message': 'All items processed',
+            'results': all_results
+        })
         
     except Exception as e:
         print(f"Error in scrape_prices: {str(e)}")
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+def stream_format():
+    """'sse' when asked for by ?format=sse or an event-stream Accept header, otherwise 'ndjson'."""
+    requested = request.args.get('format')
+    if requested in ('sse', 'ndjson'):
+        return requested
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return 'sse'
+    return 'ndjson'
+
+
+def encode_event(fmt, event, record):
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+    return json.dumps({'type': event, **record}, ensure_ascii=False) + "\n"
+
+
+def stream_job(job, fmt, timeout):
+    """
+    Yield each item's result as soon as it completes, then a summary record.
+
+    Items are timed as in finish_within_deadlines against the job workers.
+    Timed-out items are reported as such; the job itself keeps running and
+    stays available through its status URL.
+    """
+    def encode(event, record):
+        return encode_event(fmt, event, record)
+
+    seen = 0
+
+    def wait_finished(pending, seconds):
+        nonlocal seen
+        finished = job.wait(seen, seconds)
+        seen += len(finished)
+        return finished
+
+    started = time.monotonic()
+    succeeded = failed = 0
+    for index, timed_out in finish_within_deadlines(len(job.items), job.item_started_at.__getitem__, wait_finished,
+                                                    timeout, SCRAPE_JOB_WORKERS):
+        result = _timed_out(job.items[index], timeout) if timed_out else job.results[index]
+        if result.get('status') == 'success':
+            succeeded += 1
+        else:
+            failed += 1
+        yield encode('result', {'index': index, 'item': job.items[index], 'result': result})
+
+    yield encode('summary', {
+        'status': 'success',
+        'message': 'All items processed',
+        'job_id': job.id,
+        'total': len(job.items),
+        'succeeded': succeeded,
+        'failed': failed,
+        'elapsed': round(time.monotonic() - started, 3)
+    })
+
+
+def stream_response(stream):
+    """Serve stream(fmt), an iterable of encoded records, as an unbuffered NDJSON or SSE response."""
+    fmt = stream_format()
+    return Response(
+        stream(fmt),
+        mimetype='text/event-stream' if fmt == 'sse' else 'application/x-ndjson',
+        # Stop reverse proxies from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@scraper_bp.route('/api/scrape/stream', methods=['POST'])
+def scrape_prices_stream():
+    """Streaming /api/scrape: one NDJSON line (or SSE event) per item as it finishes, then a summary."""
+    location, processed_items, options, error = _parse_scrape_request(request.get_json())
+    if error:
+        return error
+
+    job = scrape_jobs.submit(location, processed_items, **options)
+    return stream_response(lambda fmt: stream_job(job, fmt, SCRAPER_ITEM_TIMEOUT))
+
+
+@scraper_bp.route('/api/scrape/jobs', methods=['POST'])
+def submit_scrape_job():
+    location, processed_items, options, error = _parse_scrape_request(request.get_json())
+    if error:
+        return error
+
+    job = scrape_jobs.submit(location, processed_items, **options)
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job.id,
+        'status_url': f'/api/scrape/jobs/{job.id}'
+    }), 202
+
+
+@scraper_bp.route('/api/scrape/jobs/<job_id>', methods=['GET'])
+def scrape_job_status(job_id):
+    """Job status and results so far; ?wait=<seconds> long-polls until the job finishes."""
+    job = scrape_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+
+    try:
+        wait = min(float(request.args.get('wait', 0)), SCRAPE_JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'wait must be a number of seconds'}), 400
+
+    deadline = time.monotonic() + wait
+    seen = len(job.completed)
+    while job.status != 'done' and time.monotonic() < deadline:
+        seen += len(job.wait(seen, deadline - time.monotonic()))
+    return jsonify(job.to_dict()), 200
+
+
+@scraper_bp.route('/api/scrape/jobs/<job_id>/events', methods=['GET'])
+def scrape_job_events(job_id):
+    """Stream a submitted job's results, including those that finished before subscribing."""
+    job = scrape_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return stream_response(lambda fmt: stream_job(job, fmt, SCRAPER_ITEM_TIMEOUT))
+
+
+@scraper_bp.route('/api/scrape/pool', methods=['GET'])
+def scraper_pool_status():
+    return jsonify({
+        **scraper_pool.status(),
+        'addresses': address_cache.status(),
+        'coalescing': inflight_scrapes.status(),
+        'jobs': scrape_jobs.status()
+    }), 200
+
+
+@scraper_bp.route('/api/scrape/cache', methods=['GET'])
+def price_cache_status():
+    if not price_cache:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **price_cache.status()}), 200
+
+
+@scraper_bp.route('/api/prices/history', methods=['GET'])
+def price_history_query():
+    """Cheapest price and daily trend for ?product=, optionally in ?location=, over the last ?days=."""
+    if not price_history:
+        return jsonify({'enabled': False}), 200
+
+    product_name = resolve_product(request.args.get('product', ''))
+    if not product_name:
+        return jsonify({'error': 'Unknown or missing product'}), 400
+    try:
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
+    if not 1 <= days <= PRICE_HISTORY_MAX_DAYS:
+        return jsonify({'error': f'days must be between 1 and {PRICE_HISTORY_MAX_DAYS}'}), 400
+
+    try:
+        return jsonify(price_history.query(product_name, request.args.get('location'), days)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@scraper_bp.route('/api/scrape/warm', methods=['GET', 'POST'])
+def cache_warming():
+    """GET reports warming runs and how often warmed entries were served; POST starts a run."""
+    if not cache_warmer:
+        return jsonify({'enabled': False}), 200
+
+    if request.method == 'GET':
+        try:
+            return jsonify({
+                'enabled': True,
+                'scheduled': CACHE_WARMER_ENABLED,
+                **cache_warmer.status(),
+                'warmed_hits': price_cache.status()['warmed_hits'],
+                **price_cache.warming_report(),
+                'runs': cache_warmer.recent_runs()
+            }), 200
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Forbidden'}), 403
+
+    data = request.get_json(silent=True) or {}
+    budget = data.get('budget')
+    if budget is not None and (isinstance(budget, bool) or not isinstance(budget, int) or budget < 1):
+        return jsonify({'error': 'budget must be a positive integer'}), 400
+
+    if cache_warmer.status()['running']:
+        return jsonify({'error': 'A cache warming run is already in progress'}), 409
+
+    if not data.get('dry_run', False):
+        # A real run scrapes up to budget items, so it reports through GET when done
+        def run():
+            try:
+                cache_warmer.run(dry_run=False, budget=budget)
+            except Exception as e:
+                print(f"Error during cache warming: {str(e)}")
+
+        threading.Thread(target=run, name="cache-warm-manual", daemon=True).start()
+        return jsonify({'status': 'started'}), 202
+
+    try:
+        return jsonify(cache_warmer.run(dry_run=True, budget=budget)), 200
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
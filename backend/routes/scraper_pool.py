@@ -0,0 +1,195 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from .locations import normalise_location
+
+
+class PoolExhausted(TimeoutError):
+    """Raised when no scraper session becomes available within the acquire timeout."""
+
+
+class _PooledSession:
+    __slots__ = ("scraper", "uses", "last_used")
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+
+class ScraperPool:
+    """
+    Process-wide pool of warm CHPScraper sessions.
+
+    Sessions are created lazily up to size, health-checked when checked out,
+    recycled after max_uses or after an error, and shut down once they have
+    been idle for idle_timeout seconds.
+    """
+
+    def __init__(self, factory, size: int = 2, max_uses: int = 50, idle_timeout: float = 300,
+                 acquire_timeout: float = 60):
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        self._total = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "unhealthy": 0, "idle_closed": 0, "checkouts": 0}
+
+        self._reaper = threading.Thread(target=self._reap_idle, name="scraper-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    @contextmanager
+    def session(self, timeout: float = None, location: str = None):
+        """
+        Check out a scraper for the duration of a with-block.
+
+        When location is given, an idle session that already has that location
+        entered is preferred. The session is discarded instead of returned if
+        the block raises.
+        """
+        prefer = normalise_location(location) if location else None
+        pooled = self._acquire(self.acquire_timeout if timeout is None else timeout, prefer)
+        failed = False
+        try:
+            yield pooled.scraper
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(pooled, discard=failed)
+
+    def prewarm(self, count: int = 1):
+        """Start up to count sessions in the background so the first requests find them warm."""
+        def run():
+            # Hold every session until all are started, otherwise the same one is reused
+            started = []
+            try:
+                for _ in range(min(count, self.size)):
+                    started.append(self._acquire(self.acquire_timeout))
+            except Exception as e:
+                print(f"Error prewarming scraper pool: {str(e)}")
+            for pooled in started:
+                self._release(pooled, discard=False, count_use=False)
+
+        threading.Thread(target=run, name="scraper-pool-prewarm", daemon=True).start()
+
+    def _acquire(self, timeout: float, prefer: str = None) -> _PooledSession:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Scraper pool is shut down")
+                    if self._idle:
+                        pooled = self._pop_idle(prefer)
+                        break
+                    if self._total < self.size:
+                        self._total += 1
+                        pooled = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhausted(f"No scraper session available within {timeout}s")
+                    self._condition.wait(remaining)
+                self.stats["checkouts"] += 1
+
+            if pooled is None:
+                try:
+                    pooled = _PooledSession(self.factory())
+                except Exception:
+                    with self._condition:
+                        self._total -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self.stats["created"] += 1
+                return pooled
+
+            if self._check(pooled):
+                return pooled
+
+            # The browser crashed or hung while idle; replace it
+            with self._condition:
+                self.stats["unhealthy"] += 1
+            self._discard(pooled)
+
+    def has_location(self, location: str) -> bool:
+        """Whether an idle session already has location entered."""
+        wanted = normalise_location(location)
+        with self._condition:
+            return any(getattr(pooled.scraper, "current_location", None) == wanted for pooled in self._idle)
+
+    def _pop_idle(self, prefer: str = None) -> _PooledSession:
+        """Pop the idle session on the preferred location if any, else the most recently used one."""
+        if prefer:
+            for index in range(len(self._idle) - 1, -1, -1):
+                if getattr(self._idle[index].scraper, "current_location", None) == prefer:
+                    return self._idle.pop(index)
+        return self._idle.pop()
+
+    def _check(self, pooled: _PooledSession) -> bool:
+        """Health-check an idle session and bring it back to its start page."""
+        try:
+            if not pooled.scraper.is_healthy():
+                return False
+            pooled.scraper.reset()
+            return True
+        except Exception as e:
+            print(f"Error checking pooled scraper: {str(e)}")
+            return False
+
+    def _release(self, pooled: _PooledSession, discard: bool, count_use: bool = True):
+        if count_use:
+            pooled.uses += 1
+        pooled.last_used = time.monotonic()
+
+        if discard or self._closed or (self.max_uses and pooled.uses >= self.max_uses):
+            with self._condition:
+                self.stats["recycled"] += 1
+            self._discard(pooled)
+            return
+
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def _discard(self, pooled: _PooledSession):
+        try:
+            pooled.scraper.cleanup()
+        finally:
+            with self._condition:
+                self._total -= 1
+                self._condition.notify()
+
+    def _reap_idle(self):
+        while not self._closed:
+            time.sleep(max(1.0, min(self.idle_timeout / 2, 30.0)))
+            cutoff = time.monotonic() - self.idle_timeout
+            with self._condition:
+                expired = [pooled for pooled in self._idle if pooled.last_used < cutoff]
+                self._idle = [pooled for pooled in self._idle if pooled.last_used >= cutoff]
+                self.stats["idle_closed"] += len(expired)
+            for pooled in expired:
+                self._discard(pooled)
+
+    def status(self) -> dict:
+        with self._condition:
+            return {
+                "size": self.size,
+                "open": self._total,
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+                **self.stats,
+            }
+
+    def shutdown(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
@@ -0,0 +1,148 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, GEOSPHERE, UpdateOne
+
+from .locations import normalise_location
+
+
+def store_key(store_chain: str, store_name: str, address: str) -> str:
+    return "|".join(" ".join(str(part).split()).lower() for part in (store_chain, store_name, address))
+
+
+def _location_field(location: str) -> str:
+    # Field names may not contain dots or start with $
+    return "distances." + normalise_location(location).replace(".", " ").replace("$", "").strip()
+
+
+def _public(doc) -> dict:
+    store = {
+        "store_chain": doc.get("store_chain"),
+        "store_name": doc.get("store_name"),
+        "address": doc.get("address"),
+        "items": doc.get("items", []),
+        "prices": doc.get("prices", {}),
+        "last_seen": doc.get("last_seen"),
+    }
+    position = doc.get("position")
+    if position:
+        store["lon"], store["lat"] = position["coordinates"]
+    if "distance_km" in doc:
+        store["distance_km"] = doc["distance_km"]
+    return store
+
+
+class StoreCatalogue:
+    """
+    Persistent catalogue of stores seen in CHP results, queried without a browser.
+
+    Every results row a search returns is upserted with the product it
+    carried, its price and its distance from the searched location. Stores
+    imported with coordinates also get a GeoJSON position under a 2dsphere
+    index, so they can be found by lat/lon as well as by a location that
+    has been searched before.
+    """
+
+    def __init__(self, collection_getter):
+        self._collection_getter = collection_getter
+        self._indexes_ready = False
+
+    @property
+    def collection(self):
+        collection = self._collection_getter()
+        if not self._indexes_ready:
+            collection.create_index([("position", GEOSPHERE)], sparse=True)
+            collection.create_index([("items", ASCENDING)])
+            collection.create_index([("distances.$**", ASCENDING)])
+            self._indexes_ready = True
+        return collection
+
+    def harvest(self, location: str, product_name: str, rows) -> int:
+        """Upsert the stores of one search's results table; returns how many rows were written."""
+        now = datetime.utcnow()
+        distance_field = _location_field(location)
+        operations = []
+        for row in rows:
+            update = {
+                "$set": {
+                    "store_chain": row["store_chain"],
+                    "store_name": row["store_name"],
+                    "address": row["address"],
+                    "last_seen": now,
+                    f"prices.{product_name}": row["price"] if row["price"] != float("inf") else None,
+                },
+                "$addToSet": {"items": product_name},
+            }
+            if row["distance_num"] != float("inf"):
+                update["$set"][distance_field] = row["distance_num"]
+            operations.append(UpdateOne(
+                {"_id": store_key(row["store_chain"], row["store_name"], row["address"])}, update, upsert=True
+            ))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def bulk_import(self, stores) -> int:
+        """
+        Upsert stores from an external list.
+
+        Each entry needs store_chain, store_name and address, and may carry
+        lat/lon and a list of items.
+        """
+        now = datetime.utcnow()
+        operations = []
+        for store in stores:
+            fields = {
+                "store_chain": store["store_chain"],
+                "store_name": store["store_name"],
+                "address": store["address"],
+                "imported_at": now,
+            }
+            if store.get("lat") is not None and store.get("lon") is not None:
+                fields["position"] = {"type": "Point", "coordinates": [float(store["lon"]), float(store["lat"])]}
+            update = {"$set": fields}
+            if store.get("items"):
+                update["$addToSet"] = {"items": {"$each": list(store["items"])}}
+            operations.append(UpdateOne(
+                {"_id": store_key(store["store_chain"], store["store_name"], store["address"])}, update, upsert=True
+            ))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def nearest(self, location: str = None, lat: float = None, lon: float = None, item: str = None,
+                limit: int = 5) -> list:
+        """
+        Nearest stores, optionally only those known to carry item.
+
+        Uses the 2dsphere index when lat/lon are given, otherwise the distances
+        recorded from searches of location. Without either, the cheapest known
+        stores for item are returned.
+        """
+        query = {"items": item} if item else {}
+
+        if lat is not None and lon is not None:
+            query["position"] = {"$nearSphere": {"$geometry": {"type": "Point", "coordinates": [lon, lat]}}}
+            return [_public(doc) for doc in self.collection.find(query).limit(limit)]
+
+        if location:
+            field = _location_field(location)
+            query[field] = {"$exists": True}
+            stores = []
+            for doc in self.collection.find(query).sort(field, ASCENDING).limit(limit):
+                doc["distance_km"] = doc["distances"][field.split(".", 1)[1]]
+                stores.append(_public(doc))
+            return stores
+
+        if item:
+            price_field = f"prices.{item}"
+            query[price_field] = {"$ne": None}
+            return [_public(doc) for doc in self.collection.find(query).sort(price_field, ASCENDING).limit(limit)]
+
+        return []
+
+    def status(self) -> dict:
+        collection = self.collection
+        return {
+            "stores": collection.estimated_document_count(),
+            "with_position": collection.count_documents({"position": {"$exists": True}}),
+        }
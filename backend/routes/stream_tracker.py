@@ -0,0 +1,183 @@
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+# Longest side of the grayscale frames used for scene-change checks and tracking
+TRACK_SIZE = 320
+# Grid of points sampled inside each box for optical flow
+TRACK_GRID = 5
+
+
+class StreamSession:
+    """
+    Per-client state for streaming detection.
+
+    Keeps the boxes from the last keyframe and moves them with sparse optical
+    flow on the frames in between, so the model only runs when the scene has
+    changed, tracking is lost, or keyframe_interval frames have passed.
+    """
+
+    def __init__(self, session_id: str, options: dict, keyframe_interval: int, scene_change_threshold: float):
+        self.session_id = session_id
+        self.options = options
+        self.keyframe_interval = keyframe_interval
+        self.scene_change_threshold = scene_change_threshold
+        self.lock = threading.Lock()
+        self._arrival_lock = threading.Lock()
+        self.latest_seq = -1
+        self.processed_seq = -1
+        self.last_seen = time.monotonic()
+        self.detections = []
+        self.frames_since_keyframe = 0
+        self.keyframe_thumb = None
+        self.prev_gray = None
+        self.prev_ratio = None
+        self.prev_transform = None
+        self.tracking_lost = True
+        self.stats = {"frames": 0, "keyframes": 0, "tracked": 0, "dropped": 0}
+
+    def mark_arrival(self, seq: int) -> bool:
+        """Record a frame's arrival; returns False if a newer frame was already seen."""
+        self.last_seen = time.monotonic()
+        with self._arrival_lock:
+            if seq <= self.processed_seq or seq < self.latest_seq:
+                return False
+            self.latest_seq = max(self.latest_seq, seq)
+            return True
+
+    def is_stale(self, seq: int) -> bool:
+        """True once a newer frame has arrived or been processed."""
+        return seq < self.latest_seq or seq <= self.processed_seq
+
+    def needs_keyframe(self, gray, transform) -> bool:
+        if self.tracking_lost or self.keyframe_thumb is None:
+            return True
+        if (transform["width"], transform["height"]) != (self.prev_transform["width"], self.prev_transform["height"]):
+            return True
+        if self.frames_since_keyframe >= self.keyframe_interval:
+            return True
+        thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+        difference = float(np.mean(cv2.absdiff(thumb, self.keyframe_thumb)))
+        return difference > self.scene_change_threshold
+
+    def update_keyframe(self, gray, ratio, transform, detections):
+        self.detections = detections
+        self.keyframe_thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+        self.frames_since_keyframe = 0
+        self.tracking_lost = False
+        self.prev_gray = gray
+        self.prev_ratio = ratio
+        self.prev_transform = transform
+        self.stats["keyframes"] += 1
+
+    def track(self, gray, ratio, transform):
+        """Move the keyframe boxes onto the current frame with Lucas-Kanade optical flow."""
+        self.frames_since_keyframe += 1
+        self.stats["tracked"] += 1
+
+        tracked = []
+        for detection in self.detections:
+            shift = _box_shift(self.prev_gray, gray, self.prev_ratio, detection["box"], self.prev_transform)
+            if shift is None:
+                # Too few points followed the box; re-detect on the next frame
+                self.tracking_lost = True
+                tracked.append(detection)
+                continue
+            dx, dy = shift
+            x1, y1, x2, y2 = detection["box"]
+            tracked.append({
+                **detection,
+                "box": [
+                    float(min(max(x1 + dx, 0), transform["width"])),
+                    float(min(max(y1 + dy, 0), transform["height"])),
+                    float(min(max(x2 + dx, 0), transform["width"])),
+                    float(min(max(y2 + dy, 0), transform["height"])),
+                ],
+            })
+
+        self.detections = tracked
+        self.prev_gray = gray
+        self.prev_ratio = ratio
+        self.prev_transform = transform
+        return tracked
+
+
+def tracking_frame(img):
+    """
+    Grayscale copy of a model input scaled down to TRACK_SIZE for tracking.
+
+    Returns (gray, ratio) where ratio maps model input pixels to tracking pixels.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    ratio = TRACK_SIZE / max(gray.shape[:2])
+    if ratio >= 1:
+        return gray, 1.0
+    return cv2.resize(gray, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA), ratio
+
+
+def _box_shift(prev_gray, gray, track_ratio, box, transform):
+    """
+    Median displacement of points inside box between two tracking frames,
+    in original image pixels, or None if too few points could be followed.
+    """
+    # Original image -> model input -> tracking frame
+    x1, y1, x2, y2 = box
+    tx1 = (x1 * transform["scale_x"] + transform["pad_x"]) * track_ratio
+    tx2 = (x2 * transform["scale_x"] + transform["pad_x"]) * track_ratio
+    ty1 = (y1 * transform["scale_y"] + transform["pad_y"]) * track_ratio
+    ty2 = (y2 * transform["scale_y"] + transform["pad_y"]) * track_ratio
+    if tx2 - tx1 < 2 or ty2 - ty1 < 2:
+        return None
+
+    xs = np.linspace(tx1, tx2, TRACK_GRID + 2)[1:-1]
+    ys = np.linspace(ty1, ty2, TRACK_GRID + 2)[1:-1]
+    points = np.array([[x, y] for y in ys for x in xs], dtype=np.float32).reshape(-1, 1, 2)
+
+    moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+    followed = status.reshape(-1) == 1
+    if followed.sum() < len(points) * 0.3:
+        return None
+
+    delta = (moved - points).reshape(-1, 2)[followed]
+    dx, dy = np.median(delta, axis=0)
+    return float(dx / track_ratio / transform["scale_x"]), float(dy / track_ratio / transform["scale_y"])
+
+
+class SessionStore:
+    """Streaming sessions by id, expiring those idle for longer than ttl_seconds."""
+
+    def __init__(self, ttl_seconds: float, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, options: dict, keyframe_interval: int, scene_change_threshold: float):
+        """Create a session, or return None when max_sessions are active."""
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            session = StreamSession(uuid.uuid4().hex, options, keyframe_interval, scene_change_threshold)
+            self._sessions[session.session_id] = session
+            return session
+
+    def get(self, session_id: str):
+        with self._lock:
+            self._expire()
+            return self._sessions.get(session_id)
+
+    def close(self, session_id: str):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for session_id in [key for key, session in self._sessions.items() if session.last_seen < cutoff]:
+            del self._sessions[session_id]
@@ -0,0 +1,174 @@
+"""
+Tests for the browserless chp.co.il client against a local server of captured pages.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from routes import chp_http_scraper
+from routes.chp_http_scraper import (
+    ADDRESS_AUTOCOMPLETE_PATH, COMPARE_RESULTS_PATH, PRODUCT_AUTOCOMPLETE_PATH, CHPHttpScraper,
+    parse_results_table,
+)
+from routes.locations import AddressCache
+
+FIXTURES = Path(__file__).parent / "fixtures" / "chp"
+
+
+class FixtureSite:
+    """
+    Serves captured chp.co.il responses on localhost.
+
+    pages maps a request path to a fixture file name; requests holds the
+    (path, query) of every request received.
+    """
+
+    def __init__(self, pages: dict):
+        self.pages = dict(pages)
+        self.requests = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                site.requests.append((url.path, parse_qs(url.query)))
+                name = site.pages.get(url.path)
+                if name is None:
+                    self.send_error(404)
+                    return
+                body = (FIXTURES / name).read_bytes()
+                content_type = "application/json" if name.endswith(".json") else "text/html"
+                self.send_response(200)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def paths(self):
+        return [path for path, _ in self.requests]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+SITE_PAGES = {
+    ADDRESS_AUTOCOMPLETE_PATH: "addresses.json",
+    PRODUCT_AUTOCOMPLETE_PATH: "products.json",
+    COMPARE_RESULTS_PATH: "compare_results.html",
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_address_cache(monkeypatch):
+    monkeypatch.setattr(chp_http_scraper, "address_cache", AddressCache())
+
+
+@pytest.fixture
+def site():
+    with FixtureSite(SITE_PAGES) as site:
+        yield site
+
+
+@pytest.fixture
+def scraper(site):
+    scraper = CHPHttpScraper(base_url=site.base_url, timeout=5)
+    yield scraper
+    scraper.cleanup()
+
+
+def test_search_product_ranks_captured_results(scraper):
+    result = scraper.search_product("Herzl Tel Aviv", "Banana")
+
+    assert result["status"] == "success"
+    assert result["backend"] == "http"
+    assert result["hebrew_product"] == "בננה"
+    by_price = result["results"]["by_price"]
+    by_distance = result["results"]["by_distance"]
+    assert [store["price"] for store in by_price] == [5.90, 6.40, 7.90]
+    assert by_price[0]["store_chain"] == "רמי לוי"
+    assert by_price[0]["price_display"] == "₪5.90"
+    assert [store["distance_num"] for store in by_distance] == [0.4, 1.2, 3.1]
+    assert by_distance[0]["store_name"] == "ויקטורי דיזנגוף"
+
+
+def test_search_product_submits_resolved_form_fields(scraper, site):
+    scraper.search_product("Herzl Tel Aviv", "Banana")
+
+    _, query = next(request for request in site.requests if request[0] == COMPARE_RESULTS_PATH)
+    assert query["shopping_address"] == ["הרצל, תל אביב - יפו"]
+    assert query["shopping_address_city_id"] == ["5000"]
+    assert query["shopping_address_street_id"] == ["1523"]
+    assert query["product_name_or_barcode"] == ["בננה - במשקל"]
+    assert query["product_barcode"] == ["7290000000107"]
+
+
+def test_include_all_returns_every_row(scraper):
+    result = scraper.search_product("Herzl Tel Aviv", "Banana", top_n=1, include_all=True)
+
+    assert len(result["results"]["by_price"]) == 1
+    assert len(result["results"]["all"]) == 5
+    unavailable = [store for store in result["results"]["all"] if store["store_chain"] == "טיב טעם"]
+    assert unavailable[0]["price"] == float("inf")
+
+
+def test_address_is_resolved_once_per_location(scraper, site):
+    scraper.search_product("Herzl Tel Aviv", "Banana")
+    scraper.search_product("  herzl tel aviv ", "Banana")
+
+    assert site.paths().count(ADDRESS_AUTOCOMPLETE_PATH) == 1
+    assert site.paths().count(COMPARE_RESULTS_PATH) == 2
+
+
+def test_page_without_results_table_is_an_http_error(site, scraper):
+    site.pages[COMPARE_RESULTS_PATH] = "compare_results_no_table.html"
+
+    result = scraper.search_product("Herzl Tel Aviv", "Banana")
+
+    assert result["status"] == "error"
+    assert result["error_type"] == "http"
+
+
+def test_missing_endpoint_is_an_http_error(site, scraper):
+    del site.pages[COMPARE_RESULTS_PATH]
+
+    result = scraper.search_product("Herzl Tel Aviv", "Banana")
+
+    assert result["status"] == "error"
+    assert result["error_type"] == "http"
+
+
+def test_unknown_product_fails_without_requests(scraper, site):
+    result = scraper.search_product("Herzl Tel Aviv", "Durian")
+
+    assert result["status"] == "error"
+    assert site.requests == []
+
+
+def test_parse_results_table_requires_table():
+    html = (FIXTURES / "compare_results_no_table.html").read_text(encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        parse_results_table(html)
@@ -0,0 +1,70 @@
+"""
+Tests for near-duplicate lookups in the detection cache.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import random
+
+import pytest
+
+pytest.importorskip("cv2")
+
+from routes.detection_cache import DetectionCache
+
+
+def flip_bits(value: int, bits) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_finds_the_closest_entry_within_the_distance():
+    cache = DetectionCache(1024 * 1024, 60, phash_distance=4)
+    base = 0x0123456789ABCDEF
+    cache.put("far", ["far"], phash=flip_bits(base, [0, 13, 26, 39, 52]))
+    cache.put("near", ["near"], phash=flip_bits(base, [1, 40]))
+
+    assert cache.get_similar(base) == ["near"]
+    assert cache.get_similar(flip_bits(base, range(0, 64, 2))) is None
+
+
+def test_only_entries_of_the_same_variant_match():
+    cache = DetectionCache(1024 * 1024, 60, phash_distance=4)
+    cache.put("a", ["a"], phash=42, variant="produce")
+
+    assert cache.get_similar(42, variant="all") is None
+    assert cache.get_similar(42, variant="produce") == ["a"]
+
+
+def test_evicted_and_cleared_entries_are_no_longer_found():
+    cache = DetectionCache(1024 * 1024, 60, phash_distance=4)
+    cache.put("a", ["a"], phash=0)
+    cache.put("a", ["b"], phash=(1 << 64) - 1)
+    assert cache.get_similar(0) is None
+    assert cache.get_similar((1 << 64) - 1) == ["b"]
+
+    cache.clear()
+    assert cache.get_similar((1 << 64) - 1) is None
+
+
+@pytest.mark.parametrize("distance", [0, 4, 10])
+def test_matches_a_full_scan(distance):
+    rng = random.Random(distance)
+    cache = DetectionCache(64 * 1024 * 1024, 60, phash_distance=distance)
+    hashes = {}
+    for n in range(500):
+        base = rng.getrandbits(64)
+        hashes[f"k{n}"] = base
+        cache.put(f"k{n}", n, phash=base)
+
+    for _ in range(200):
+        probe = flip_bits(rng.choice(list(hashes.values())), rng.sample(range(64), rng.randint(0, distance + 2)))
+        distances = {key: bin(value ^ probe).count("1") for key, value in hashes.items()}
+        closest = min(distances.values())
+        found = cache.get_similar(probe)
+        if closest > distance:
+            assert found is None
+        else:
+            assert distances[f"k{found}"] == closest
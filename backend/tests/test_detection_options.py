@@ -0,0 +1,59 @@
+"""
+Tests for validating detection request options.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import io
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+# Nothing here runs the model, so don't start loading one on import
+os.environ.setdefault("MODEL_PRELOAD", "false")
+
+from flask import Flask
+
+from routes import process
+from routes.process import detection_options
+
+
+def test_defaults():
+    assert detection_options({}) == {"top_k": 1, "min_confidence": 0.0, "classes": None}
+
+
+@pytest.mark.parametrize("value", ["0", "0.25", "1"])
+def test_min_confidence_in_range_is_accepted(value):
+    assert detection_options({"min_confidence": value})["min_confidence"] == float(value)
+
+
+@pytest.mark.parametrize("value", ["nan", "-0.1", "1.5", "inf", "abc"])
+def test_min_confidence_out_of_range_is_rejected(value):
+    with pytest.raises(ValueError):
+        detection_options({"min_confidence": value})
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(process.process_bp)
+    return app.test_client()
+
+
+def test_invalid_min_confidence_is_a_bad_request(client):
+    response = client.post("/process-image", data={
+        "image": (io.BytesIO(b"not an image"), "a.jpg"), "min_confidence": "nan",
+    })
+    assert response.status_code == 400
+    assert "min_confidence" in response.get_json()["error"]
+
+
+def test_batch_image_count_is_capped(client, monkeypatch):
+    monkeypatch.setattr(process, "DETECTION_MAX_BATCH_IMAGES", 2)
+    response = client.post("/process-image-batch", data={
+        "images": [(io.BytesIO(b"x"), f"{n}.jpg") for n in range(3)],
+    })
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "At most 2 images per batch"}
@@ -0,0 +1,88 @@
+"""
+Tests for the detector backend parity check, using recorded detections.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from routes import detector_backends
+
+DETECTIONS = json.loads((Path(__file__).parent / "fixtures" / "parity" / "detections.json").read_text())
+IMAGES = ["apples.jpg", "banana.jpg", "empty.jpg"]
+
+
+class _Column(list):
+    def tolist(self):
+        return list(self)
+
+
+class _Boxes:
+    def __init__(self, detections, class_ids):
+        self.cls = _Column(class_ids[label] for label, _, _ in detections)
+        self.xyxy = _Column(box for _, box, _ in detections)
+        self.conf = _Column(conf for _, _, conf in detections)
+
+
+class _Result:
+    def __init__(self, detections):
+        labels = sorted({label for backend in DETECTIONS.values() for image in backend.values() for label, _, _ in image})
+        self.names = dict(enumerate(labels))
+        self.boxes = _Boxes(detections, {label: index for index, label in self.names.items()})
+
+
+class RecordedDetector:
+    """Stands in for a loaded backend by replaying its recorded detections."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __call__(self, image, imgsz=640, verbose=True):
+        return [_Result(DETECTIONS[self.backend][image])]
+
+
+@pytest.fixture(autouse=True)
+def recorded_backends(monkeypatch):
+    monkeypatch.setattr(detector_backends, "load_detector",
+                        lambda weights, backend="pytorch", imgsz=640: RecordedDetector(backend))
+
+
+def test_backend_within_tolerances_passes():
+    report = detector_backends.check_parity("yolo.pt", "onnx", IMAGES)
+
+    assert report["passed"]
+    assert [entry["mismatches"] for entry in report["images"]] == [[], [], []]
+
+
+def test_confidence_drift_and_extra_detections_fail():
+    report = detector_backends.check_parity("yolo.pt", "onnx-int8", IMAGES)
+
+    assert not report["passed"]
+    apples, banana, empty = report["images"]
+    # 0.91 -> 0.80 is beyond the default 0.05 confidence tolerance, so both directions are unmatched
+    assert [m["confidence"] for m in apples["missing"]] == [0.91]
+    assert [m["confidence"] for m in apples["extra"]] == [0.80]
+    assert banana["missing"] == []
+    assert [m["label"] for m in banana["extra"]] == ["orange"]
+    assert empty["mismatches"] == []
+
+
+def test_tolerances_are_configurable():
+    assert not detector_backends.check_parity("yolo.pt", "openvino", IMAGES)["passed"]
+    # The shifted banana box has an IoU of about 0.76 with the reference
+    assert detector_backends.check_parity("yolo.pt", "openvino", IMAGES, min_iou=0.7)["passed"]
+    assert detector_backends.check_parity("yolo.pt", "onnx-int8", ["apples.jpg"], max_conf_delta=0.2)["passed"]
+
+
+def test_cli_exit_code(capsys):
+    assert detector_backends.main(["--backend", "onnx", *IMAGES]) == 0
+    assert "Parity check passed" in capsys.readouterr().out
+
+    assert detector_backends.main(["--backend", "onnx-int8", *IMAGES]) == 1
+    out = capsys.readouterr().out
+    assert "apples.jpg: 2 reference / 2 onnx-int8 - 1 missing, 1 extra" in out
+    assert "Parity check FAILED" in out
@@ -0,0 +1,99 @@
+"""
+Tests for the inference worker pool, using a stub ultralytics package.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+STUB_ULTRALYTICS = '''
+import json
+import os
+import sys
+
+import numpy as np
+
+
+class _Array:
+    def __init__(self, values):
+        self._values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+
+class _Boxes:
+    def __init__(self):
+        self.xyxy = _Array([[0, 0, 10, 10]])
+        self.conf = _Array([0.9])
+        self.cls = _Array([0])
+
+
+class _Result:
+    boxes = _Boxes()
+
+
+class YOLO:
+    names = {0: "apple"}
+
+    def __init__(self, weights, task=None):
+        with open(os.environ["STUB_MODULES_FILE"], "w") as f:
+            json.dump(sorted(sys.modules), f)
+
+    def __call__(self, images):
+        return [_Result() for _ in images]
+'''
+
+# Stands in for `python3 app.py`: a main module with startup side effects that creates a pool
+MAIN_SCRIPT = '''
+import sys
+sys.path.insert(0, {backend!r})
+print("main module imported", flush=True)
+
+import numpy as np
+from routes.inference_pool import InferencePool
+
+if __name__ == "__main__":
+    pool = InferencePool("stub.pt", 2, task_timeout=30)
+    assert pool.wait_ready(30), "workers did not become ready"
+    results = pool.predict([np.zeros((8, 8, 3), dtype=np.uint8)] * 2)
+    print("boxes", [len(result.boxes) for result in results], results[0].names[0], flush=True)
+    pool.shutdown()
+'''
+
+
+def test_workers_do_not_reimport_the_main_module(tmp_path):
+    (tmp_path / "ultralytics").mkdir()
+    (tmp_path / "ultralytics" / "__init__.py").write_text(STUB_ULTRALYTICS)
+    main = tmp_path / "app.py"
+    main.write_text(textwrap.dedent(MAIN_SCRIPT.format(backend=str(BACKEND))))
+    modules_file = tmp_path / "worker_modules.json"
+
+    completed = subprocess.run(
+        [sys.executable, str(main)],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": str(tmp_path), "STUB_MODULES_FILE": str(modules_file)},
+        capture_output=True, text=True, timeout=120,
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.count("main module imported") == 1
+    assert "boxes [1, 1] apple" in completed.stdout
+    worker_modules = json.loads(modules_file.read_text())
+    assert "app" not in worker_modules
+    assert "routes.process" not in worker_modules
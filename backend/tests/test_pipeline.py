@@ -0,0 +1,79 @@
+"""
+Tests for when /detect-and-price prepares a scraper session.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import io
+import os
+
+import pytest
+
+pytest.importorskip("cv2")
+# Nothing here runs the model, so don't start loading one on import
+os.environ.setdefault("MODEL_PRELOAD", "false")
+
+from flask import Flask
+
+from routes import pipeline, scraper
+from routes.scraper_pool import ScraperPool
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn, args))
+
+
+@pytest.fixture
+def post(monkeypatch):
+    prepared = RecordingExecutor()
+    monkeypatch.setattr(pipeline, "prepare_executor", prepared)
+
+    def post(labels, cached=()):
+        monkeypatch.setattr(pipeline, "detect_image", lambda data, options: (
+            [{"label": label, "confidence": 0.9, "box": [0, 0, 1, 1]} for label in labels], "MISS"))
+        monkeypatch.setattr(pipeline, "needs_scrape", lambda location, product: product not in cached)
+        app = Flask(__name__)
+        app.register_blueprint(pipeline.pipeline_bp)
+        # The streamed body, and with it the price lookups, is never consumed
+        response = app.test_client().post("/detect-and-price", buffered=False, data={
+            "image": (io.BytesIO(b"image"), "a.jpg"), "location": "Tel Aviv",
+        })
+        assert response.status_code == 200
+        return prepared.calls
+    return post
+
+
+def test_no_session_is_prepared_without_produce(post):
+    assert post(["person"]) == []
+
+
+def test_no_session_is_prepared_when_every_price_is_cached(post):
+    assert post(["apple", "banana"], cached={"Apple", "Banana"}) == []
+
+
+def test_a_session_is_prepared_for_a_cache_miss(post):
+    assert post(["apple", "banana"], cached={"Apple"}) == [(scraper.prepare_location, ("Tel Aviv",))]
+
+
+class _Scraper:
+    def __init__(self):
+        self.current_location = None
+
+    def cleanup(self):
+        pass
+
+
+def test_pool_reports_idle_sessions_on_a_location():
+    pool = ScraperPool(_Scraper, size=1)
+    with pool.session() as session:
+        session.current_location = "tel aviv"
+    try:
+        assert pool.has_location("Tel Aviv")
+        assert not pool.has_location("Haifa")
+    finally:
+        pool.shutdown()
@@ -0,0 +1,97 @@
+"""
+Tests for warmed-entry accounting in the price cache, against an in-memory collection.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pymongo import ReturnDocument
+
+from routes.price_cache import PriceCache, cache_key
+
+RESULT = {"status": "success", "product": "apple", "results": []}
+
+
+class MemoryCollection:
+    """The few collection methods PriceCache uses, with writes counted."""
+
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def find_one(self, query, projection=None):
+        doc = self.docs.get(query["_id"])
+        return copy.deepcopy(doc) if doc else None
+
+    def update_one(self, query, update, upsert=False):
+        self.writes += 1
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            doc = self.docs[query["_id"]] = {"_id": query["_id"], **update.get("$setOnInsert", {})}
+        doc.update(update.get("$set", {}))
+
+    def find_one_and_update(self, query, update, projection=None, return_document=ReturnDocument.BEFORE):
+        self.writes += 1
+        doc = self.docs.get(query["_id"])
+        if doc is None or any(doc.get(field) != value for field, value in query.items()):
+            return None
+        before = copy.deepcopy(doc)
+        for field, amount in update["$inc"].items():
+            doc[field] = doc.get(field, 0) + amount
+        return before
+
+
+@pytest.fixture
+def cache():
+    collection = MemoryCollection()
+    executor = ThreadPoolExecutor(max_workers=1)
+    cache = PriceCache(lambda: collection, fresh_seconds=3600, max_age_seconds=7200, refresh_executor=executor)
+    cache.test_collection = collection
+    yield cache
+    executor.shutdown(wait=True)
+
+
+def test_warmed_hits_are_buffered_and_each_entry_counted_once(cache):
+    cache.warm("Tel Aviv", "apple", lambda: RESULT, run_id="run-1")
+    writes = cache.test_collection.writes
+
+    for _ in range(3):
+        assert cache.get("Tel Aviv", "apple", lambda: pytest.fail("fetched on a hit"))["cache"] == "hit"
+    assert cache.test_collection.writes == writes
+
+    assert cache.flush_served() == {"run-1": {"requests": 3, "entries": 1}}
+    assert cache.test_collection.docs[cache_key("Tel Aviv", "apple")]["served"] == 3
+
+    cache.get("Tel Aviv", "apple", lambda: RESULT)
+    # Already served before, so it is not a first hit again
+    assert cache.flush_served() == {"run-1": {"requests": 1, "entries": 0}}
+    assert cache.flush_served() == {}
+
+
+def test_hits_on_an_entry_warmed_again_by_another_run_are_dropped(cache):
+    cache.warm("Tel Aviv", "apple", lambda: RESULT, run_id="run-1")
+    cache.get("Tel Aviv", "apple", lambda: RESULT)
+    cache.warm("Tel Aviv", "apple", lambda: RESULT, run_id="run-2")
+
+    assert cache.flush_served() == {}
+    assert cache.test_collection.docs[cache_key("Tel Aviv", "apple")]["served"] == 0
+
+
+def test_refresh_keeps_the_warming_marks(cache):
+    cache.warm("Tel Aviv", "apple", lambda: RESULT, run_id="run-1")
+    cache.get("Tel Aviv", "apple", lambda: RESULT)
+    cache.flush_served()
+
+    key = cache_key("Tel Aviv", "apple")
+    cache._store(key, "Tel Aviv", "apple", {**RESULT, "results": ["new"]}, keep_marks=True)
+
+    doc = cache.test_collection.docs[key]
+    assert (doc["warmed"], doc["warm_run"], doc["served"]) == (True, "run-1", 1)
+    assert doc["result"]["results"] == ["new"]
@@ -0,0 +1,87 @@
+"""
+Tests for updating a profile, against an in-memory users collection.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+from flask_jwt_extended import create_access_token
+from pymongo.errors import DuplicateKeyError
+
+from extensions import bcrypt, jwt
+from routes import profile
+
+
+class UsersCollection:
+    """Users keyed by _id, with usernames kept unique like the users.username_unique index."""
+
+    def __init__(self, users):
+        self.users = {user['_id']: dict(user) for user in users}
+
+    def find_one(self, query):
+        for user in self.users.values():
+            if all(self._matches(user.get(field), value) for field, value in query.items()):
+                return dict(user)
+        return None
+
+    def update_one(self, query, update):
+        username = update['$set'].get('username')
+        if any(user['username'] == username and user_id != query['_id'] for user_id, user in self.users.items()):
+            raise DuplicateKeyError("E11000 duplicate key error collection: users index: username_unique")
+        self.users[query['_id']].update(update['$set'])
+
+    @staticmethod
+    def _matches(actual, expected):
+        if isinstance(expected, dict) and '$ne' in expected:
+            return actual != expected['$ne']
+        return actual == expected
+
+
+ALICE, BOB = ObjectId(), ObjectId()
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = UsersCollection([
+        {'_id': ALICE, 'username': 'alice', 'email': 'alice@example.com', 'password': 'x'},
+        {'_id': BOB, 'username': 'bob', 'email': 'bob@example.com', 'password': 'x'},
+    ])
+    monkeypatch.setattr(profile, 'mongo', SimpleNamespace(db=SimpleNamespace(users=users)))
+    return users
+
+
+def put_profile(body, index_enforced):
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'profile-test-secret-' + 'x' * 32
+    app.config['USERNAME_INDEX_ENFORCED'] = index_enforced
+    bcrypt.init_app(app)
+    jwt.init_app(app)
+    app.register_blueprint(profile.profile_bp)
+    with app.app_context():
+        token = create_access_token(identity=str(ALICE))
+    return app.test_client().put('/profile', json=body, headers={'Authorization': f'Bearer {token}'})
+
+
+@pytest.mark.parametrize('index_enforced', [True, False])
+def test_renaming_to_a_taken_username_is_a_conflict(users, index_enforced):
+    response = put_profile({'username': 'bob'}, index_enforced)
+
+    assert response.status_code == 409
+    assert response.get_json() == {'message': 'Username already exists'}
+    assert users.users[ALICE]['username'] == 'alice'
+
+
+def test_renaming_to_a_free_username_succeeds(users):
+    response = put_profile({'username': 'carol'}, index_enforced=True)
+
+    assert response.status_code == 200
+    assert users.users[ALICE]['username'] == 'carol'
+
+
+def test_keeping_the_same_username_is_not_a_conflict(users):
+    assert put_profile({'username': 'alice', 'bio': 'hi'}, index_enforced=False).status_code == 200
@@ -0,0 +1,37 @@
+"""
+Tests for validating /api/scrape style request bodies.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import pytest
+from flask import Flask
+
+from routes import scraper
+
+
+@pytest.fixture
+def parse():
+    app = Flask(__name__)
+
+    def parse(body):
+        with app.test_request_context():
+            location, items, options, error = scraper._parse_scrape_request(body)
+            if error:
+                response, status = error
+                return status, response.get_json()["message"]
+            return location, items, options
+    return parse
+
+
+@pytest.mark.parametrize("location", ["", "   ", None, 42, ["Tel Aviv"]])
+def test_location_must_be_a_non_empty_string(parse, location):
+    assert parse({"location": location, "items": ["apple"]}) == (400, "Location must be a non-empty string")
+
+
+def test_item_count_is_capped(parse, monkeypatch):
+    monkeypatch.setattr(scraper, "SCRAPER_MAX_ITEMS", 3)
+    assert parse({"location": "Tel Aviv", "items": ["apple"] * 4}) == (400, "At most 3 items per request")
+    location, items, _ = parse({"location": "Tel Aviv", "items": ["apple"] * 3})
+    assert (location, len(items)) == ("Tel Aviv", 3)
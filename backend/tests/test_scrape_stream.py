@@ -0,0 +1,73 @@
+"""
+Tests for streaming scrape job results.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from routes import scraper
+from routes.scrape_jobs import ScrapeJobQueue
+
+
+def fake_search(delays):
+    def search(location, item, **options):
+        time.sleep(delays.get(item, 0.2))
+        return {"status": "success", "product": item, "results": []}
+    return search
+
+
+@pytest.fixture
+def job_queue(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(scraper, "SCRAPE_JOB_WORKERS", 2)
+    yield lambda delays: ScrapeJobQueue(fake_search(delays), executor)
+    executor.shutdown(wait=True)
+
+
+def read_stream(job, timeout):
+    return [json.loads(line) for line in scraper.stream_job(job, "ndjson", timeout)]
+
+
+def test_items_queued_behind_the_workers_are_not_timed_out(job_queue):
+    items = [f"item{n}" for n in range(6)]
+    job = job_queue({}).submit("Tel Aviv", items)
+
+    records = read_stream(job, timeout=0.3)
+
+    results = [record for record in records if record["type"] == "result"]
+    assert sorted(record["index"] for record in results) == list(range(6))
+    assert all(record["result"]["status"] == "success" for record in results)
+    assert records[-1]["type"] == "summary"
+    assert (records[-1]["succeeded"], records[-1]["failed"]) == (6, 0)
+
+
+def test_an_item_running_past_its_timeout_is_reported_once(job_queue):
+    job = job_queue({"slow": 1.0}).submit("Tel Aviv", ["slow", "fast"])
+
+    records = read_stream(job, timeout=0.4)
+
+    results = {record["item"]: record["result"] for record in records if record["type"] == "result"}
+    assert len([record for record in records if record["type"] == "result"]) == 2
+    assert results["slow"]["error_type"] == "timeout"
+    assert results["fast"]["status"] == "success"
+    assert (records[-1]["succeeded"], records[-1]["failed"]) == (1, 1)
+
+
+def test_batch_search_applies_the_same_deadlines(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(scraper, "item_executor", executor)
+    monkeypatch.setattr(scraper, "SCRAPER_CONCURRENCY", 2)
+    search = fake_search({"slow": 1.0})
+    monkeypatch.setattr(scraper, "_search_item", lambda location, item, top_n, include_all: search(location, item))
+
+    results = scraper.search_items("Tel Aviv", ["slow"] + [f"item{n}" for n in range(4)], timeout=0.4)
+    executor.shutdown(wait=True)
+
+    assert results[0]["error_type"] == "timeout"
+    assert all(result["status"] == "success" for result in results[1:])